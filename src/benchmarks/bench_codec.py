@@ -0,0 +1,77 @@
+"""
+Microbenchmark of FSM value encodings
+
+Run from the repository root: python src/benchmarks/bench_codec.py
+"""
+import json
+import sys
+import timeit
+from os import environ, path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+environ.setdefault("BOT_TOKEN", "123456:benchmark")
+
+import utils.codec as codec
+from models.model_deposit import DepositChannel
+from models.model_user import ModelUser, UserAction
+
+ROUNDS = 2000
+
+
+def sample_user() -> ModelUser:
+    """A logged in user in the middle of a deposit"""
+    action = UserAction(current_action="deposit", chat_id=123456789, list_messages_ids=list(range(1000, 1040)), list_menu_ids=[1001, 1002])
+    action.action_data = {
+        "banks": [{"bank_name": f"BANK {i}", "account_name": "PT CONTOH", "account_number": f"{i:012d}", "min": 10000, "max": 50000000} for i in range(25)],
+        "promos": [{"id": i, "title": f"Promo {i}", "description": "Bonus deposit harian " * 4} for i in range(10)],
+        "amount": 150000,
+    }
+    return ModelUser(
+        username="player01",
+        name="Player One",
+        credit="1250000",
+        rank="Gold",
+        min_deposit=10000,
+        max_deposit=50000000,
+        list_messages_ids=list(range(2000, 2060)),
+        is_authenticated=True,
+        chat_id=123456789,
+        deposit_channels=[DepositChannel(name=f"Channel {i}", type="bank", code=f"CH{i}", description="Transfer bank") for i in range(15)],
+        action=action,
+    )
+
+
+def bench(label: str, encode, decode):
+    payload = encode()
+    encode_us = timeit.timeit(encode, number=ROUNDS) / ROUNDS * 1e6
+    decode_us = timeit.timeit(lambda: decode(payload), number=ROUNDS) / ROUNDS * 1e6
+    print(f"{label:<28} {len(payload):>8} B {encode_us:>10.1f} us {decode_us:>10.1f} us")
+
+
+def main():
+    user = sample_user()
+    print(f"{'encoding':<28} {'size':>10} {'encode':>13} {'decode':>13}")
+
+    # Before codecs: the model is a JSON string nested in the storage JSON
+    bench(
+        "legacy json-in-json",
+        lambda: json.dumps({"user": user.model_dump_json()}).encode(),
+        lambda raw: ModelUser.model_validate_json(json.loads(raw)["user"]),
+    )
+    # What the storage writes: pydantic's JSON bytes behind the codec header
+    for name, selected in codec.available_codecs().items():
+        bench(
+            f"codec {name}",
+            lambda selected=selected: codec.encode(user.to_state_json(), selected),
+            lambda raw: ModelUser.from_state_value(codec.decode(raw)),
+        )
+        for compression_name, compression in codec.available_compressions().items():
+            bench(
+                f"codec {name} + {compression_name}",
+                lambda selected=selected, compression=compression: codec.encode(user.to_state_json(), selected, compression),
+                lambda raw: ModelUser.from_state_value(codec.decode(raw)),
+            )
+
+
+if __name__ == "__main__":
+    main()
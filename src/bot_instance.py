@@ -1,10 +1,14 @@
 
 
 from aiogram import Bot, types
+from contextvars import ContextVar
 from os import getenv
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 from aiogram.fsm.state import State, StatesGroup
+from utils.send_scheduler import SendScheduler
 
 class GuestStates(StatesGroup):
 
@@ -50,7 +54,52 @@ class LoggedInStates(StatesGroup):
 
 
 
-bot = Bot(
-    token=str(getenv("BOT_TOKEN")),
-    default=DefaultBotProperties(parse_mode='HTML')
-)
\ No newline at end of file
+# Point at a local Bot API server (or a fake one in tests) instead of api.telegram.org
+TELEGRAM_API_SERVER = getenv("TELEGRAM_API_SERVER")
+
+# One HTTP session and send scheduler shared by the bots of every tenant
+bot_session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER)) if TELEGRAM_API_SERVER else AiohttpSession()
+bot_session.middleware(SendScheduler())
+
+_current_bot: ContextVar[Bot | None] = ContextVar("current_bot", default=None)
+
+
+def create_bot(token: str) -> Bot:
+    """Create the bot of a tenant on the shared session"""
+    return Bot(token=token, default=DefaultBotProperties(parse_mode='HTML'), session=bot_session)
+
+
+def use_bot(current: Bot):
+    """Make current the bot of this context, returns a reset token"""
+    return _current_bot.set(current)
+
+
+def reset_bot(token):
+    _current_bot.reset(token)
+
+
+class BotProxy:
+    """
+    Stands for the bot of the tenant handling the current update.
+
+    Handlers keep using `bot.send_message(...)`, the call goes to the bot set
+    with `use_bot`, or to the default bot outside of an update.
+    """
+
+    def __init__(self) -> None:
+        self._default: Bot | None = None
+
+    def set_default(self, default: Bot):
+        self._default = default
+
+    def resolve(self) -> Bot:
+        current = _current_bot.get() or self._default
+        if current is None:
+            raise RuntimeError("No bot set for the current context")
+        return current
+
+    def __getattr__(self, name: str):
+        return getattr(self.resolve(), name)
+
+
+bot = BotProxy()
@@ -189,7 +189,7 @@ async def callback_deposit_confirm_yes(callback: types.CallbackQuery, config: Bo
     action_model: ModelAction | None = await model_utils.load_model(ModelAction, state)
     await callback.answer()
     if action_model is not None:
-        logger.debug(f"Unsetting message id: {callback.message.message_id}")
+        logger.debug("Unsetting message id: %s", callback.message.message_id)
         action_model.unset_message_id(callback.message.message_id)
         await action_model.save_to_state()
     user_model.unset_message_id(callback.message.message_id)
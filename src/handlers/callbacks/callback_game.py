@@ -1,4 +1,3 @@
-import base64
 from contextlib import suppress
 from typing import List
 from aiogram import types
@@ -11,16 +10,20 @@ from config import BotConfig
 from models.model_games import Game, Provider
 from models.model_user import ModelUser
 from services.otp_services.api_client import OTPAPIClient
+from services.otp_services.game_search import GameSearchIndex
+from utils.callback_tokens import CallbackTokenRegistry, GameLaunchPayload, GameSearchPayload, decode_legacy_game_launch, decode_legacy_game_search
 from bot_instance import LoggedInStates, bot
 from utils.logger import get_logger
 
 logger = get_logger()
 
-async def callback_game_generate_launch(callback: types.CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
-    game_launch_string = callback.data.replace("game_launch_", "")
-    game_launch_string = base64.b64decode(game_launch_string).decode()
-    game_code, provider_id = game_launch_string.split("|")
-    api_response = await api_client.get_game_url(game_code, provider_id)
+async def callback_game_generate_launch(callback: types.CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser, callback_tokens: CallbackTokenRegistry) -> None:
+    token = callback.data.replace("game_launch_", "")
+    payload = await callback_tokens.resolve(token, GameLaunchPayload) or decode_legacy_game_launch(token)
+    if payload is None:
+        await callback.answer("Tombol sudah kadaluarsa, silahkan buka kembali daftar game")
+        return
+    api_response = await api_client.get_game_url(payload.game_code, payload.provider_id)
     if api_response.is_error:
         await callback.answer(f"Gagal memuat game: {api_response.get_error_message()}")
         return
@@ -43,9 +46,8 @@ async def callback_game_generate_launch(callback: types.CallbackQuery, config: B
     await user_model.save_to_state()
     return
 
-async def _game_search(user_model: ModelUser, search_base64: str, page: int, api_client: OTPAPIClient, chat_id: int, message_id: int = None) -> None:
-    search_query = base64.b64decode(search_base64).decode('utf-8')
-    api_response = await api_client.search_games(search_query, page)
+async def _game_search(user_model: ModelUser, search_query: str, page: int, api_client: OTPAPIClient, game_search_index: GameSearchIndex, callback_tokens: CallbackTokenRegistry, chat_id: int, message_id: int = None) -> None:
+    api_response = await game_search_index.search_or_fetch(api_client, search_query, page)
 
     if api_response.is_error:
         user_model.add_message_id((await bot.send_message(chat_id=chat_id, text=api_response.get_error_message())).message_id)
@@ -61,23 +63,23 @@ async def _game_search(user_model: ModelUser, search_base64: str, page: int, api
     for game in api_response.data['games']:
         game_list.append(Game(**game))
 
+    launch_tokens = await callback_tokens.issue_many([GameLaunchPayload(game_code=game.game_code, provider_id=game.provider_id) for game in game_list])
+    search_token = await callback_tokens.issue(GameSearchPayload(query=search_query))
+
     builder = InlineKeyboardBuilder()
-    for game in game_list:
-        game_launch_string = base64.b64encode(f"{game.game_code}|{game.provider_id}".encode('utf-8')).decode()
-        builder.add(InlineKeyboardButton(text=game.game_name, callback_data=f"game_launch_{game_launch_string}"))
+    for game, launch_token in zip(game_list, launch_tokens):
+        builder.add(InlineKeyboardButton(text=game.game_name, callback_data=f"game_launch_{launch_token}"))
     builder.adjust(1)
 
     navigation_builder = InlineKeyboardBuilder()
     if page > 1:
-        navigation_builder.add(InlineKeyboardButton(text="⬅️ Sebelumnya", callback_data=f"game_search_{page - 1}_{search_base64}"))
+        navigation_builder.add(InlineKeyboardButton(text="⬅️ Sebelumnya", callback_data=f"game_search_{page - 1}_{search_token}"))
     else :
         navigation_builder.add(InlineKeyboardButton(text="🚫 Sebelumnya", callback_data=f"action_reply_callback_Sudah_Halaman_Pertama"))
     navigation_builder.add(InlineKeyboardButton(text="↩️ Tutup", callback_data=f"action_close_with_answer_"))
 
     if api_response.data['pagination']['hasMore'] == True:
-        callback_data_str = f"game_search_{search_query}_{page + 1}"
-        logger.debug(f"Game search callback data: {callback_data_str}")
-        navigation_builder.add(InlineKeyboardButton(text="Selanjutnya ➡️", callback_data=f"game_search_{page + 1}_{search_base64}"))
+        navigation_builder.add(InlineKeyboardButton(text="Selanjutnya ➡️", callback_data=f"game_search_{page + 1}_{search_token}"))
     else:
         navigation_builder.add(InlineKeyboardButton(text="Selanjutnya 🚫", callback_data=f"action_reply_callback_Sudah_Halaman_Terakhir"))
     navigation_builder.adjust(3)
@@ -92,17 +94,20 @@ async def _game_search(user_model: ModelUser, search_base64: str, page: int, api
         await user_model.save_to_state()
     return
 
-async def callback_game_search_navigation(callback: types.CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
-    data = callback.data.replace("game_search_", "").split("_")
+async def callback_game_search_navigation(callback: types.CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser, game_search_index: GameSearchIndex, callback_tokens: CallbackTokenRegistry) -> None:
+    data = callback.data.replace("game_search_", "").split("_", 1)
     if data[0] == "cancel":
         await callback.answer("Pencarian game dibatalkan")
         await callback.message.delete()
         await state.set_state(LoggedInStates.main_menu)
         return
     page = int(data[0])
-    search_base64 = data[1]
+    payload = await callback_tokens.resolve(data[1], GameSearchPayload) or decode_legacy_game_search(data[1])
+    if payload is None:
+        await callback.answer("Pencarian sudah kadaluarsa, silahkan cari kembali")
+        return
     
-    await _game_search(user_model, search_base64, page, api_client, callback.message.chat.id, callback.message.message_id)
+    await _game_search(user_model, payload.query, page, api_client, game_search_index, callback_tokens, callback.message.chat.id, callback.message.message_id)
     return
 
 async def callback_game_search_init(callback: types.CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
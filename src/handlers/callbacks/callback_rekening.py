@@ -11,6 +11,8 @@ from config import BotConfig
 from models.model_rekening import Rekening
 from services.otp_services.api_client import OTPAPIClient
 from models.model_user import ModelUser, RekeningAdd
+import models.message_ids as message_ids
+from utils.deletion_queue import deletion_queue
 from services.otp_services.models import APIResponse
 
 async def callback_rekening_list(callback: CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
@@ -57,8 +59,7 @@ async def callback_rekening_add(callback: CallbackQuery, config: BotConfig, stat
     await state.set_state(LoggedInStates.rekening_add_1_ask_bank_name)
     
     if user_model.temp_rekening_add is not None and user_model.temp_rekening_add.list_messages_ids is not None:
-        with suppress(Exception):
-            await bot.delete_messages(user_model.chat_id, user_model.temp_rekening_add.list_messages_ids)
+        deletion_queue.enqueue(user_model.chat_id, message_ids.deletable_ids(user_model.temp_rekening_add.list_messages_ids))
 
     user_model.temp_rekening_add = RekeningAdd(
         initiator_message_id=callback.message.message_id,
@@ -105,8 +106,7 @@ async def callback_rekening_add_bank(callback: CallbackQuery, config: BotConfig,
 async def callback_rekening_add_cancel(callback: CallbackQuery, config: BotConfig, state: FSMContext, user_model: ModelUser) -> None:
     await state.set_state(None)
     if user_model.temp_rekening_add is not None and user_model.temp_rekening_add.list_messages_ids is not None:
-        with suppress(Exception):
-            await bot.delete_messages(user_model.chat_id, user_model.temp_rekening_add.list_messages_ids)
+        deletion_queue.enqueue(user_model.chat_id, message_ids.deletable_ids(user_model.temp_rekening_add.list_messages_ids))
     user_model.temp_rekening_add = None
     await callback.answer("Penambahan rekening dibatalkan")
     return
@@ -118,8 +118,7 @@ async def callback_rekening_add_confirm(callback: CallbackQuery, config: BotConf
         return
     
     if user_model.temp_rekening_add is not None and user_model.temp_rekening_add.list_messages_ids is not None:
-        with suppress(Exception):
-            await bot.delete_messages(user_model.chat_id, user_model.temp_rekening_add.list_messages_ids)
+        deletion_queue.enqueue(user_model.chat_id, message_ids.deletable_ids(user_model.temp_rekening_add.list_messages_ids))
     if user_model.temp_rekening_add.initiator_message_id is not None:
         with suppress(Exception):
             await bot.delete_message(user_model.chat_id, user_model.temp_rekening_add.initiator_message_id)
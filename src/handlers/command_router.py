@@ -4,7 +4,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
 
 from bot_instance import GuestStates, LoggedInStates
-from handlers.commands.cmd_developer import cmd_developer, cmd_developer_jump, cmd_developer_whoami
+from handlers.commands.cmd_developer import cmd_developer, cmd_developer_jump, cmd_developer_metrics, cmd_developer_whoami
 from handlers.commands.cmd_unbind import cmd_unbind
 from handlers.middlewares.verify_contact import VerifyContactMiddleware
 from handlers.middlewares.whitelisted_only import WhitelistedOnlyMiddleware
@@ -40,6 +40,7 @@ developer_only_router = Router()
 developer_only_router.message.middleware(WhitelistedOnlyMiddleware())
 developer_only_router.message.register(cmd_developer, Command('developer'))
 developer_only_router.message.register(cmd_developer_jump, Command('developer_jump'))
+developer_only_router.message.register(cmd_developer_metrics, Command('developer_metrics'))
 command_router.include_routers(developer_only_router)
 
 authenticated_only_router = Router()
@@ -4,6 +4,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from config import BotConfig
 from utils.logger import get_logger
+import utils.metrics as metrics
 
 logger = get_logger()
 
@@ -29,7 +30,7 @@ async def cmd_developer_jump(msg: types.Message, config: BotConfig) -> None:
         return
 
     text = msg.text.replace("/developer_jump", "").strip().split(" ")
-    logger.debug(f"Developer jump command text: {text}")
+    logger.debug("Developer jump command text: %s", text)
     if len(text) == 0:
         await msg.answer(f"Please provide a command to jump to")
         return
@@ -55,4 +56,16 @@ async def cmd_developer_whoami(msg: types.Message, config: BotConfig) -> None:
     """Process the `whoami` command"""
     user_id = msg.from_user.id
     await msg.answer(f"Your user ID is {user_id}")
-    return
\ No newline at end of file
+    return
+
+async def cmd_developer_metrics(msg: types.Message, config: BotConfig) -> None:
+    """Process the `developer_metrics` command"""
+    data = metrics.snapshot()
+    lines = ["<b>Counters</b>"]
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"{name}: {value}")
+    lines.append("\n<b>Timings</b>")
+    for name, timing in sorted(data["timings"].items()):
+        lines.append(f"{name}: n={timing['count']} avg={timing['avg'] * 1000:.2f}ms max={timing['max'] * 1000:.2f}ms")
+    await msg.answer("\n".join(lines))
+    return
@@ -2,6 +2,7 @@ from aiogram import Router, types
 from aiogram.fsm.context import FSMContext
 
 from config import BotConfig
+from utils.unit_of_work import discard_pending_writes
 
 async def cmd_unbind(msg: types.Message, state: FSMContext, config: BotConfig) -> None:
     """Process the `start` command"""
@@ -16,6 +17,7 @@ async def cmd_unbind(msg: types.Message, state: FSMContext, config: BotConfig) -
     
     # Save contact data to FSM storage
     await state.update_data(**contact_data)
+    discard_pending_writes(state)
     await state.clear()
 
     await msg.answer("Unbinding successful")
@@ -1,4 +1,3 @@
-import base64
 from aiogram import Router, types
 from aiogram.types.contact import Contact
 from aiogram.fsm.context import FSMContext
@@ -9,19 +8,20 @@ from config import BotConfig
 from models.model_games import AvailableGames
 from models.model_user import ModelUser
 from services.otp_services.api_client import OTPAPIClient
+from services.otp_services.game_search import GameSearchIndex
+from utils.callback_tokens import CallbackTokenRegistry
 import utils.validators as validators
 from bot_instance import LoggedInStates
 from keyboards.inline import keyboard_guest
 import utils.models as model_utils
 from handlers.callbacks.callback_game import _game_search
 
-async def msg_game_search(msg: types.Message, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
+async def msg_game_search(msg: types.Message, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser, game_search_index: GameSearchIndex, callback_tokens: CallbackTokenRegistry) -> None:
     if msg.text is None:
         user_model.add_message_id((await msg.answer("Silahkan kirimkan pencarian game")).message_id)
         user_model.save_to_state()
         return
     
     await state.set_state(LoggedInStates.main_menu)
-    search_base64 = base64.b64encode(msg.text.encode()).decode()
-    await _game_search(user_model, search_base64, 1, api_client, msg.chat.id)
+    await _game_search(user_model, msg.text, 1, api_client, game_search_index, callback_tokens, msg.chat.id)
     return
\ No newline at end of file
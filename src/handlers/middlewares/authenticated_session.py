@@ -13,6 +13,7 @@ from models.model_user import ModelUser
 from services.otp_services.api_client import OTPAPIClient
 from services.otp_services.exceptions import InvalidSessionError
 from services.otp_services.models import APIResponse
+from services.otp_services.session_cache import session_cache
 import utils.fsm as fsm_utils
 from bot_instance import GuestStates, bot
 import utils.models as handler_utils
@@ -40,14 +41,18 @@ class AuthenticatedSessionMiddleware(BaseModelMiddleware):
             if user_model is None:
                 raise InvalidSessionError("User model is None")
 
-            response: APIResponse = await api_client.me()
-            if response.is_authentication_error:
-                raise InvalidSessionError()
-            if(response.data is None):
-                logger.warning("response from OTP API is None")
-                logger.warning(f"Response details - is_error: {response.is_error}, is_authentication_error: {response.is_authentication_error}, is_session_expired: {response.is_session_expired}")
-                return
-            await user_model.fill_from_dict(response.data)
+            me_data = session_cache.get(api_client.base_url, api_client.telegram_id)
+            if me_data is None:
+                response: APIResponse = await api_client.me()
+                if response.is_authentication_error:
+                    raise InvalidSessionError()
+                if(response.data is None):
+                    logger.warning("response from OTP API is None")
+                    logger.warning(f"Response details - is_error: {response.is_error}, is_authentication_error: {response.is_authentication_error}, is_session_expired: {response.is_session_expired}")
+                    return
+                me_data = response.data
+                session_cache.set(api_client.base_url, api_client.telegram_id, me_data)
+            await user_model.fill_from_dict(me_data)
             
             if isinstance(event, CallbackQuery):
                 user_model.add_message_id(event.message.message_id)
@@ -64,9 +69,10 @@ class AuthenticatedSessionMiddleware(BaseModelMiddleware):
         except InvalidSessionError as e:
             logger.warning("InvalidSessionError")
             logger.warning(f"Error: {e}")
+            api_client.invalidate_session()
             if user_model is None:
                 user_model = await handler_utils.load_model(ModelUser, self.fsm_context)
-            logger.debug(f"user_model is None: {user_model is None}")
+            logger.debug("user_model is None: %s", user_model is None)
             if user_model:
                 await user_model.delete_all_messages()
                 await user_model.delete_from_state()
@@ -0,0 +1,35 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from bot_instance import reset_bot, use_bot
+from tenants import TenantRegistry
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Routes an update to its tenant: config, services and the bot behind `bot_instance.bot`"""
+
+    def __init__(self, tenants: TenantRegistry):
+        self.tenants = tenants
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        tenant = self.tenants.get(data['bot'].id)
+        if tenant is None:
+            logger.warning(f"Dropping update {event.update_id} of unknown bot {data['bot'].id}")
+            return None
+
+        data['config'] = tenant.config
+        data.update(tenant.services)
+        token = use_bot(tenant.bot)
+        try:
+            return await handler(event, data)
+        finally:
+            reset_bot(token)
@@ -0,0 +1,25 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+import utils.unit_of_work as unit_of_work
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """Defers state model writes of an update and flushes them once the handler returns"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        state = data.get('state')
+        if state is None:
+            return await handler(event, data)
+
+        token = unit_of_work.begin(state)
+        try:
+            return await handler(event, data)
+        finally:
+            await unit_of_work.commit(token)
@@ -0,0 +1,48 @@
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+import utils.metrics as metrics
+from services.update_stream import UpdateStream
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class UpdateIngressMiddleware(BaseMiddleware):
+    """
+    Hands every update over to the worker processes instead of handling it here.
+
+    A failed publish raises, so a webhook answers 500 and Telegram sends the
+    update again. Polling confirms an update whatever its handling did, with
+    `retry` the publish is retried until it succeeds instead.
+    """
+
+    def __init__(self, streams: dict[int, UpdateStream], retry: bool = False):
+        # Keyed by bot id, each tenant has its own streams
+        self.streams = streams
+        self.retry = retry
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        chat_id = chat.id if chat else user.id if user else None
+        attempt = 0
+        while True:
+            try:
+                await self.streams[data['bot'].id].publish(event, chat_id)
+                return None
+            except Exception as e:
+                if not self.retry:
+                    raise
+                attempt += 1
+                metrics.incr("update_stream.publish_retry")
+                logger.warning(f"Publishing update {event.update_id} failed, attempt {attempt}: {e}")
+                await asyncio.sleep(random.uniform(0, min(10, 2 ** attempt)))
@@ -186,7 +186,7 @@ async def deposit_ask_method(event: CallbackQuery | Message, config: BotConfig,
     builder.adjust(1)
     message = f"Pilih metode pembayaran untuk melakukan deposit"
     method_message_id = user_model.action.get_action_data(MESSAGE_MENU_DEPOSIT_METHOD)
-    logger.debug(f"Method Message ID: {method_message_id}")
+    logger.debug("Method Message ID: %s", method_message_id)
     if method_message_id is not None:
         await bot.edit_message_text(chat_id=chat_id, message_id=method_message_id, text=message, reply_markup=builder.as_markup())
     else:
@@ -904,7 +904,7 @@ async def deposit_back_button(event: CallbackQuery, config: BotConfig, state: FS
     
     navigation_to = event.data.replace("deposit_back_button_", "")
 
-    logger.debug(f"Navigation To: {navigation_to}")
+    logger.debug("Navigation To: %s", navigation_to)
     if navigation_to == "ask_method":
         await event.message.delete()
         user_model.action.set_action_data(MESSAGE_MENU_DEPOSIT_CHANNEL, None)
@@ -4,23 +4,27 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types.inline_keyboard_button import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import BotConfig
-from models.model_games import Game, Provider
+from models.model_games import Game
 from models.model_user import ModelUser
 from services.otp_services.api_client import OTPAPIClient
+from services.otp_services.catalog_cache import CatalogCache
+from services.otp_services.prefetch import PagePrefetcher
+from services.otp_services.provider_catalog import ProviderCatalog
+from utils.callback_tokens import CallbackTokenRegistry, GameLaunchPayload
 from utils.logger import get_logger
-import base64
 from contextlib import suppress
 
 logger = get_logger()
 
-async def game_list(callback: CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
+async def game_list(callback: CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser, catalog_cache: CatalogCache, catalog_prefetcher: PagePrefetcher, callback_tokens: CallbackTokenRegistry) -> None:
     callback_data = callback.data.replace("game_list_", "").split("_")
     game_part = callback_data[0].split("|")
     game_type = game_part[0]
-    logger.debug(f"Game callback data: {callback_data}")
+    logger.debug("Game callback data: %s", callback_data)
     provider_id = game_part[1] if len(game_part) > 1 else "all"
     page = int(callback_data[1]) if len(callback_data) > 1 else 1
-    response = await api_client.list_games_by_type_and_provider(game_type, provider_id, page)
+    catalog_prefetcher.record_access(game_type, provider_id, page)
+    response = await catalog_cache.get_games(api_client, game_type, provider_id, page)
     is_edit_message = len(callback_data) == 2 or provider_id != "all"
 
     if response.is_error:
@@ -35,10 +39,11 @@ async def game_list(callback: CallbackQuery, config: BotConfig, state: FSMContex
 
     lastPage = response.data['pagination']['lastPage']
    
+    launch_tokens = await callback_tokens.issue_many([GameLaunchPayload(game_code=game.game_code, provider_id=game.provider_id) for game in game_list])
+
     builder = InlineKeyboardBuilder()
-    for game in game_list:
-        game_launch_string = base64.b64encode(f"{game.game_code}|{game.provider_id}".encode()).decode()
-        builder.add(InlineKeyboardButton(text=game.game_name, callback_data=f"game_launch_{game_launch_string}"))
+    for game, launch_token in zip(game_list, launch_tokens):
+        builder.add(InlineKeyboardButton(text=game.game_name, callback_data=f"game_launch_{launch_token}"))
     builder.adjust(1)
 
     navigation_builder = InlineKeyboardBuilder()
@@ -74,27 +79,15 @@ async def game_list(callback: CallbackQuery, config: BotConfig, state: FSMContex
         user_model.add_message_id((await callback.message.answer(text=reply_message, reply_markup=builder.as_markup())).message_id)
 
     await callback.answer(f"Menampilkan Halaman {page}/{lastPage}")
+    catalog_prefetcher.schedule(game_type, provider_id, page, response.data['pagination']['hasMore'] == True)
     return
 
-async def game_provider_list(callback: CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser) -> None:
+async def game_provider_list(callback: CallbackQuery, config: BotConfig, state: FSMContext, api_client: OTPAPIClient, user_model: ModelUser, provider_catalog: ProviderCatalog) -> None:
     callback_data = callback.data.replace("game_provider_list_", "")
     game_type = callback_data
-    providers = await api_client.list_providers(game_type)
-    if providers.is_error:
+    provider_table = await provider_catalog.get_or_fetch(api_client, game_type)
+    if provider_table is None:
         await callback.answer("Gagal memuat daftar provider")
         return
-    providers_list: List[Provider] = []
-    for provider in providers.data.get('providers', []):
-        if provider is not None: providers_list.append(Provider(**provider))
-    builder = InlineKeyboardBuilder()
-    for provider in providers_list:
-        builder.add(InlineKeyboardButton(text=f"{provider.provider_name_mobile}", callback_data=f"game_list_{game_type}|{provider.provider_id}"))
-    builder.adjust(2)
-    navigation_builder = InlineKeyboardBuilder()
-    navigation_builder.add(InlineKeyboardButton(text="🔙 Kembali", callback_data=f"game_list_{game_type}_1"))
-    navigation_builder.add(InlineKeyboardButton(text="↩️ Tutup", callback_data=f"action_close_with_answer_"))
-    navigation_builder.adjust(2)
-    builder.attach(navigation_builder)
-    await callback.message.edit_text(text=f"Menampilkan list provider untuk game <b>{game_type.capitalize()}</b>:", reply_markup=builder.as_markup())
+    await callback.message.edit_text(text=f"Menampilkan list provider untuk game <b>{game_type.capitalize()}</b>:", reply_markup=provider_table.markup)
     return
-    
\ No newline at end of file
@@ -13,6 +13,7 @@ from models.model_register import ModelRegister
 from models.model_telegram_data import ModelTelegramData
 from models.model_user import ModelUser
 from services.otp_services.api_client import OTPAPIClient
+from services.otp_services.session_cache import session_cache
 import utils.models as model_utils
 from bot_instance import GuestStates, LoggedInStates, bot
 from keyboards.reply.keyboard import get_guest_menu_builder, get_logged_in_menu_builder
@@ -89,6 +90,7 @@ Entrypoint:
 - Callback Router (data: logout)
 '''
 async def logout(callback: CallbackQuery | Message, config: BotConfig, state: FSMContext):
+    session_cache.invalidate(config.otp_host, callback.from_user.id)
     user_model: ModelUser | None = await model_utils.load_model(ModelUser, state)
     if user_model is not None:
         await user_model.logout()
@@ -7,7 +7,7 @@ from bot_instance import LoggedInStates, bot
 from config import BotConfig
 from models.model_menu import ModelMenu
 from models.model_user import ModelUser
-from services.otp_services.api_client import OTPAPIClient
+from services.otp_services.site_metadata import SiteMetadata
 import utils.models as model_utils
 from utils.logger import get_logger
 
@@ -19,15 +19,14 @@ Social Media Menu
 Entrypoint:
 - Callback Router (data: menu_social_media)
 '''
-async def social_media_menu(event: Message | CallbackQuery, config: BotConfig, state: FSMContext, user_model: ModelUser | None = None) -> None:
-    api_client = OTPAPIClient(state=state, user_id=event.from_user.id, base_url=config.otp_host)
-    response = await api_client.get_social_media()
-    if response.is_error:
-        await bot.send_message(event.chat.id, f"Gagal memuat menu social media")
+async def social_media_menu(event: Message | CallbackQuery, config: BotConfig, state: FSMContext, site_metadata: SiteMetadata, user_model: ModelUser | None = None) -> None:
+    social_media_list = await site_metadata.get_social_media()
+    if social_media_list is None:
+        await bot.send_message(event.message.chat.id, f"Gagal memuat menu social media")
         return
     
     builder = InlineKeyboardBuilder()
-    for social_media in response.data:
+    for social_media in social_media_list:
         if social_media["type"] == "phone" or social_media["type"] == "email":
             builder.add(InlineKeyboardButton(text=social_media['value'], copy_text=CopyTextButton(text=social_media['value'])))
         else:
@@ -142,7 +141,7 @@ async def guest_menu(msg: Message, config: BotConfig, state: FSMContext) -> None
 
     menu_model.add_message_id(msg.message_id)
     menu_model.logged_in=False
-    logger.debug(f"Menu model list_menu_ids: {menu_model.list_menu_ids}")
+    logger.debug("Menu model list_menu_ids: %s", menu_model.list_menu_ids)
     builder = InlineKeyboardBuilder()
     builder.add(InlineKeyboardButton(text="Login", callback_data="login"))
     builder.add(InlineKeyboardButton(text="Register", callback_data="register"))
@@ -357,7 +357,7 @@ async def register_confirm_yes(callback: CallbackQuery, config: BotConfig, state
         return
     await register_model.delete_all_messages()
     
-    await state.update_data(**{register_model._get_state_key(): None}) # Delete the register model from the state
+    await register_model.delete_from_state()
     user_model = ModelUser(
         **submit_registration.data,
         state=state,
@@ -384,7 +384,7 @@ Entrypoint:
 async def register_confirm_no(callback: CallbackQuery, config: BotConfig, state: FSMContext, register_model: ModelRegister) -> None:
     await callback.answer("Register dibatalkan")
     await register_model.delete_all_messages()
-    await state.update_data(register=None)
+    await register_model.delete_from_state()
     await callback_auth_clear(config, state)
     return
 
@@ -194,7 +194,7 @@ async def withdraw_input_amount(callback: CallbackQuery | Message, config: BotCo
             return
     
     user_credit = int(user_model.action.get_action_data(ACTION_DATA_USER_CREDIT))
-    logger.debug(f"User credit: {user_credit}")
+    logger.debug("User credit: %s", user_credit)
     if amount > user_credit:
         error_message = f"Saldo tidak cukup, saldo saat ini: <b>Rp.{user_model.action.get_action_data(ACTION_DATA_USER_CREDIT):,.0f}</b>\nSilahkan masukkan jumlah withdraw yang lebih kecil"
         if isinstance(callback, CallbackQuery):
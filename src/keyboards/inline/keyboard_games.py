@@ -0,0 +1,14 @@
+from aiogram.types import InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+def provider_list(game_type: str, providers: list[tuple[str, str]]) -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    for provider_id, provider_label in providers:
+        builder.add(InlineKeyboardButton(text=provider_label, callback_data=f"game_list_{game_type}|{provider_id}"))
+    builder.adjust(2)
+    navigation_builder = InlineKeyboardBuilder()
+    navigation_builder.add(InlineKeyboardButton(text="🔙 Kembali", callback_data=f"game_list_{game_type}_1"))
+    navigation_builder.add(InlineKeyboardButton(text="↩️ Tutup", callback_data=f"action_close_with_answer_"))
+    navigation_builder.adjust(2)
+    builder.attach(navigation_builder)
+    return builder
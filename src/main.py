@@ -10,20 +10,39 @@ if getenv("ENV_FILE") is not None:
     load_dotenv(ENV_PATH)
 
 import asyncio
-from aiogram.fsm.storage.redis import RedisStorage
+import secrets
 
 from handlers.command_router import command_router
 from handlers.message_router import message_router
 from handlers.callback_router import callback_router
 
 from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import BaseRequestHandler, setup_application
+from aiohttp import web
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram.fsm.middleware import FSMContextMiddleware
 
-from bot_instance import bot
+from bot_instance import bot_session
+from handlers.middlewares.tenant import TenantMiddleware
+from handlers.middlewares.unit_of_work import UnitOfWorkMiddleware
+from handlers.middlewares.update_ingress import UpdateIngressMiddleware
 from config import BotConfig
+from tenants import Tenant, TenantRegistry
 import redis.asyncio as redis
+from services.otp_services.http_pool import HTTPPool, set_http_pool
+from services.otp_services.catalog_cache import CatalogCache
+from services.otp_services.game_search import GameSearchIndex
+from services.otp_services.provider_catalog import ProviderCatalog
+from services.otp_services.prefetch import PagePrefetcher
+from services.otp_services.site_metadata import SiteMetadata
+from utils.callback_tokens import CallbackTokenRegistry
+from utils.storage import HashRedisStorage
+from utils.deletion_queue import deletion_queue
+from utils.chat_lock import CHAT_SERIAL_MODE, ChatEventIsolation
+from utils.codec import get_codec, get_compression
+from services.otp_services.api_client import OTPAPIClient
+from services.update_stream import UpdateStream, UpdateWorker
 
 from utils.logger import setup_logger
 
@@ -33,6 +52,21 @@ WHITELIST_MODE = str(getenv("WHITELIST_MODE")).lower() == "true"
 WEB_ID = getenv("WEB_ID")
 SITE_NAME = getenv("SITE_NAME")
 OTP_HOST = getenv("OTP_HOST")
+OTP_HTTP_LIMIT = int(getenv("OTP_HTTP_LIMIT", "100"))
+OTP_HTTP_LIMIT_PER_HOST = int(getenv("OTP_HTTP_LIMIT_PER_HOST", "30"))
+OTP_HTTP_KEEPALIVE = float(getenv("OTP_HTTP_KEEPALIVE", "30"))
+OTP_HTTP_DNS_TTL = int(getenv("OTP_HTTP_DNS_TTL", "300"))
+OTP_HTTP_TIMEOUT = float(getenv("OTP_HTTP_TIMEOUT", "30"))
+BOT_MODE = getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(getenv("WEBHOOK_PORT", "8080"))
+# all: receive and handle updates, ingress: only push them to the update stream, worker: only handle streamed updates
+BOT_ROLE = getenv("BOT_ROLE", "all").lower()
+WORKER_INDEX = int(getenv("WORKER_INDEX", "0"))
+WORKER_COUNT = int(getenv("WORKER_COUNT", "1"))
 WHITELIST_IDS = [ 
     7957553101
 ]
@@ -40,11 +74,14 @@ WHITELIST_IDS = [
 # Initialize logger
 logger = setup_logger(web_id=WEB_ID)
 
-config: BotConfig = None
-
 class RedisKeyBuilder(DefaultKeyBuilder):
+    def __init__(self, tenants: TenantRegistry | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.tenants = tenants
+
     def build(self, key: StorageKey, part: Literal['data', 'state', 'lock'] | None = None) -> str:
-        parts = [getenv("WEB_ID")]
+        # Keys start with the web id of the bot's tenant, as they did with one site per process
+        parts = [self.tenants.web_id_for(key.bot_id) if self.tenants else getenv("WEB_ID")]
 
         # Put user first (or rearrange as you wish)
         parts.append(f"c{key.chat_id if key.chat_id is not None else '0'}")
@@ -52,34 +89,180 @@ class RedisKeyBuilder(DefaultKeyBuilder):
         parts.append(part)
         return ":".join(parts)
 
+class TenantRequestHandler(BaseRequestHandler):
+    """Webhook handler for every tenant, the tenant is the {web_id} part of the path"""
+
+    def __init__(self, dispatcher: Dispatcher, tenants: TenantRegistry, handle_in_background: bool = True, **data) -> None:
+        super().__init__(dispatcher=dispatcher, handle_in_background=handle_in_background, **data)
+        self.tenants = tenants
+
+    async def resolve_bot(self, request: web.Request) -> Bot:
+        web_id = request.match_info.get("web_id")
+        tenant = self.tenants.by_web_id(web_id) if web_id else next(iter(self.tenants))
+        if tenant is None:
+            raise web.HTTPNotFound()
+        return tenant.bot
+
+    def verify_secret(self, telegram_secret_token: str, bot: Bot) -> bool:
+        secret = self.tenants.get(bot.id).webhook_secret
+        # Without a secret anyone could post updates, main refuses to start like that
+        return bool(secret) and secrets.compare_digest(telegram_secret_token, secret)
+
+    async def close(self) -> None:
+        await bot_session.close()
+
 def register_routers(dp: Dispatcher) -> None:
     """Registers routers"""
     dp.include_router(command_router)
     dp.include_router(callback_router)
     dp.include_router(message_router)
 
+async def run_polling(dp: Dispatcher, tenants: TenantRegistry, handle_as_tasks: bool = True) -> None:
+    """Receive the updates of every tenant's bot with long polling, one at a time unless handle_as_tasks"""
+    bots = [tenant.bot for tenant in tenants]
+    # getUpdates is refused while a webhook is set
+    await asyncio.gather(*(tenant_bot.delete_webhook() for tenant_bot in bots))
+    await dp.start_polling(*bots, handle_as_tasks=handle_as_tasks)
+
+async def run_webhook(dp: Dispatcher, tenants: TenantRegistry, handle_in_background: bool = True) -> None:
+    """Receive updates on an aiohttp server, Telegram gets its answer before the update is handled if handle_in_background"""
+    # A single site keeps the plain path, several sites get one path each
+    path = WEBHOOK_PATH if len(tenants) == 1 else f"{WEBHOOK_PATH.rstrip('/')}/{{web_id}}"
+    app = web.Application()
+    TenantRequestHandler(dispatcher=dp, tenants=tenants, handle_in_background=handle_in_background).register(app, path=path)
+    setup_application(app, dp)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT).start()
+    logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{path}")
+
+    # Without WEBHOOK_URL the webhook is expected to be registered elsewhere (e.g. a fake Bot API)
+    if WEBHOOK_URL:
+        await asyncio.gather(*(
+            tenant.bot.set_webhook(
+                url=f"{WEBHOOK_URL.rstrip('/')}{path.replace('{web_id}', tenant.web_id)}",
+                secret_token=tenant.webhook_secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            for tenant in tenants
+        ))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot_session.close()
+
+async def run_ingress(dp: Dispatcher, tenants: TenantRegistry, redis_client: redis.Redis) -> None:
+    """Receive updates and push them to the update stream, handlers run in the worker processes"""
+    streams = {tenant.bot.id: UpdateStream(redis=redis_client, web_id=tenant.web_id) for tenant in tenants}
+    # getUpdates confirms an update even when publishing it failed, polling keeps retrying instead
+    dp.update.outer_middleware(UpdateIngressMiddleware(streams, retry=BOT_MODE != "webhook"))
+    # Routers are still registered so allowed_updates matches what the workers handle
+    register_routers(dp)
+    # An update is only acknowledged once it is in the stream, and one chat's updates are published in order
+    if BOT_MODE == "webhook":
+        await run_webhook(dp, tenants, handle_in_background=False)
+    else:
+        await run_polling(dp, tenants, handle_as_tasks=False)
+
+async def run_worker(dp: Dispatcher, tenants: TenantRegistry, redis_client: redis.Redis) -> None:
+    """Handle the updates of the stream shards owned by this worker, for every tenant"""
+    workers = [
+        UpdateWorker(UpdateStream(redis=redis_client, web_id=tenant.web_id), dp, tenant.bot, index=WORKER_INDEX, count=WORKER_COUNT)
+        for tenant in tenants
+    ]
+    try:
+        await asyncio.gather(*(worker.run() for worker in workers))
+    finally:
+        await bot_session.close()
+
+async def setup_tenant(tenant: Tenant, redis_client: redis.Redis) -> list[asyncio.Task]:
+    """Create the services of a tenant, returns its background tasks"""
+    catalog_cache = CatalogCache(redis=redis_client, web_id=tenant.web_id)
+    game_search_index = GameSearchIndex()
+    catalog_cache.add_listener(game_search_index.on_catalog_page)
+    provider_catalog = ProviderCatalog()
+
+    # Background jobs use a client without user state, only for public endpoints
+    service_api_client = OTPAPIClient(state=None, user_id=0, base_url=tenant.config.otp_host)
+    site_metadata = SiteMetadata(service_api_client)
+    tenant.services = {
+        "catalog_cache": catalog_cache,
+        "game_search_index": game_search_index,
+        "callback_tokens": CallbackTokenRegistry(redis=redis_client, web_id=tenant.web_id),
+        "provider_catalog": provider_catalog,
+        "catalog_prefetcher": PagePrefetcher(catalog_cache, service_api_client),
+        "site_metadata": site_metadata,
+    }
+    await asyncio.gather(provider_catalog.refresh(service_api_client), site_metadata.refresh())
+    return [
+        asyncio.create_task(site_metadata.run()),
+        asyncio.create_task(provider_catalog.run(service_api_client)),
+        asyncio.create_task(game_search_index.run(catalog_cache, service_api_client, provider_catalog)),
+    ]
+
 
 async def main() -> None:
     """The main function which will execute our event loop and start polling."""
+    config = BotConfig(web_id=WEB_ID, site_name=SITE_NAME, whitelist_mode=WHITELIST_MODE, whitelist_ids=WHITELIST_IDS, otp_host=OTP_HOST)
+    tenants = TenantRegistry.load(config, TOKEN, WEBHOOK_SECRET)
+    if BOT_MODE == "webhook" and BOT_ROLE != "worker":
+        missing = [tenant.web_id for tenant in tenants if not tenant.webhook_secret]
+        if missing:
+            raise RuntimeError(f"Webhook mode needs WEBHOOK_SECRET or a webhook_secret for every site, missing for {', '.join(missing)}")
+
+    # One Redis pool for every tenant, keys are separated by web id
     redis_client = redis.Redis(host=getenv("REDIS_HOST"), port=getenv("REDIS_PORT"), password=getenv("REDIS_PASSWORD"), socket_connect_timeout=3)
     await redis_client.ping()
     logger.info("Redis Engine Ready! Vroom. Vroom.")
-    redis_storage = RedisStorage(redis=redis_client, key_builder=RedisKeyBuilder())
-    
-    config = BotConfig(web_id=WEB_ID, site_name=SITE_NAME, whitelist_mode=WHITELIST_MODE, whitelist_ids=WHITELIST_IDS, otp_host=OTP_HOST)
+    redis_storage = HashRedisStorage(redis=redis_client, key_builder=RedisKeyBuilder(tenants), codec=get_codec(), compression=get_compression())
+
+    if BOT_ROLE == "ingress":
+        # The ingress never runs handlers, none of the services below are needed
+        logger.info(f"Running as update ingress for {len(tenants)} sites using {BOT_MODE} method.")
+        # Without FSM, no state is loaded for updates that are only forwarded
+        await run_ingress(Dispatcher(disable_fsm=True), tenants, redis_client)
+        return
+
+    # One HTTP pool for every tenant's OTP host
+    http_pool = HTTPPool(
+        limit=OTP_HTTP_LIMIT,
+        limit_per_host=OTP_HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=OTP_HTTP_KEEPALIVE,
+        dns_cache_ttl=OTP_HTTP_DNS_TTL,
+        request_timeout=OTP_HTTP_TIMEOUT,
+    )
+    set_http_pool(http_pool)
+    await http_pool.start()
+
+    # The FSM middleware loads the state inside the chat lock, so updates of a chat see each other's changes
+    events_isolation = None
+    if CHAT_SERIAL_MODE != "off":
+        events_isolation = ChatEventIsolation(
+            redis=redis_client if CHAT_SERIAL_MODE == "redis" else None,
+            key_builder=redis_storage.key_builder,
+        )
+    dp = Dispatcher(storage=redis_storage, events_isolation=events_isolation)
+    # Registered after the FSM middleware so the update's state is available, and inside the chat lock.
+    # The tenant comes first, it provides config and services to everything after it,
+    # the unit of work flushes before the lock is released for the next update of the chat
+    dp.update.outer_middleware(TenantMiddleware(tenants))
+    dp.update.outer_middleware(UnitOfWorkMiddleware())
 
-    dp = Dispatcher(storage=redis_storage)
-    dp["config"] = config
+    tenant_tasks = await asyncio.gather(*(setup_tenant(tenant, redis_client) for tenant in tenants))
+    background_tasks = [deletion_queue.start()] + [task for tasks in tenant_tasks for task in tasks]
 
     register_routers(dp)
 
-    bot_username = (await bot.get_me()).username
+    bot_users = await asyncio.gather(*(tenant.bot.get_me() for tenant in tenants))
+    bot_username = ", ".join(user.username for user in bot_users)
 
     #https://emojicombos.com/ascii-art
     logger.info(r"""
 ⠀      (\__/)
        (•ㅅ•)      System is running...
-    ＿ノヽ ノ＼＿      using polling method.
+    ＿ノヽ ノ＼＿      as %s using %s method.
  `/ `/ ⌒Ｙ⌒ Ｙ ヽ     with redis storage.
  (  (三ヽ人　 /　 |     Running as @%s (https://t.me/%s)
  | ﾉ⌒＼ ￣￣ヽ  ノ     Site Name: "%s"
@@ -87,8 +270,20 @@ async def main() -> None:
      ｜( 王 ﾉ〈    (\__/)
      / ﾐ`ー―彡 \   (•ㅅ•)
     /  ╰    ╯   \  /    \>
-""", bot_username, bot_username, SITE_NAME)
-    await dp.start_polling(bot)
+""", BOT_ROLE, BOT_MODE, bot_username, bot_users[0].username, ", ".join(tenant.config.site_name for tenant in tenants))
+    try:
+        if BOT_ROLE == "worker":
+            await run_worker(dp, tenants, redis_client)
+        elif BOT_MODE == "webhook":
+            await run_webhook(dp, tenants)
+        else:
+            await run_polling(dp, tenants)
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await deletion_queue.close()
+        await http_pool.close()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@ from typing import Optional
 from pydantic import BaseModel
 from aiogram.fsm.context import FSMContext
 import asyncio
+from utils.codec import JsonBytes
+from utils.unit_of_work import current_unit_of_work
+from utils.versioned_state import write_models
 
 
 class BaseStateModel(BaseModel):
@@ -17,6 +20,12 @@ class BaseStateModel(BaseModel):
     def _auto_save_if_enabled(self):
         """Trigger auto-save if enabled and state is available"""
         if self._auto_save and self._state:
+            # Inside an update the unit of work writes the model once at the end
+            uow = current_unit_of_work(self._state)
+            if uow is not None:
+                uow.mark_dirty(self)
+                return
+
             # Cancel previous save task if it exists
             if self._save_task and not self._save_task.done():
                 # print("Cancelling previous save task")
@@ -36,17 +45,34 @@ class BaseStateModel(BaseModel):
             # print("Auto Saving model data to state", self._get_state_key())
             # Get the model name for the state key (e.g., 'register', 'user')
             state_key = self._get_state_key()
-            await self._state.update_data(**{state_key: self.model_dump_json()})
+            # Merged with whatever was saved since this copy was loaded
+            await write_models(self._state, {state_key: self})
             # print("Auto-saving model data to state", self._get_state_key())
             # Stev Code to Cancel the save task if it still exists
             if self._save_task and not self._save_task.done():
                 self._save_task.cancel()
             # print(self.model_dump_json())
 
-    def _get_state_key(self) -> str:
+    def to_state_value(self) -> dict:
+        """Plain data stored in the FSM, encoded by the storage codec"""
+        return self.model_dump(mode="json")
+
+    def to_state_json(self) -> JsonBytes:
+        """The stored value as JSON from pydantic's serializer, written by the storage without re-encoding"""
+        return JsonBytes(self.__pydantic_serializer__.to_json(self))
+
+    @classmethod
+    def from_state_value(cls, value: str | dict) -> "BaseStateModel":
+        """Build the model from FSM data, values saved before codecs are JSON strings"""
+        if isinstance(value, str):
+            return cls.model_validate_json(value)
+        return cls.model_validate(value)
+
+    @classmethod
+    def _get_state_key(cls) -> str:
         """Get the state key for this model. Override in subclasses if needed"""
         # Default: use lowercase class name
-        return self.__class__.__name__.lower().replace('model', '')
+        return cls.__name__.lower().replace('model', '')
 
     def enable_auto_save(self):
         """Enable auto-save functionality"""
@@ -62,11 +88,19 @@ class BaseStateModel(BaseModel):
 
     async def save_to_state(self):
         """Manually save to state (bypasses auto-save flag)"""
+        uow = current_unit_of_work(self._state) if self._state else None
+        if uow is not None:
+            uow.mark_dirty(self)
+            return
         await self._save_to_state()
 
     async def delete_from_state(self):
         """Delete the model from the state"""
         if self._state:
+            uow = current_unit_of_work(self._state)
+            if uow is not None:
+                uow.mark_deleted(self._get_state_key())
+                return
             await self._state.update_data(**{self._get_state_key(): None})
 
     async def fill_from_dict(self, data: dict):
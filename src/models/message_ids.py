@@ -0,0 +1,62 @@
+"""
+Bounded, age-aware lists of sent message ids
+"""
+import time
+from os import getenv
+from typing import Annotated, Any
+from pydantic import BeforeValidator
+
+# Telegram refuses to delete messages older than 48 hours, keep a safety margin
+DELETABLE_WINDOW = int(getenv("MESSAGE_IDS_DELETABLE_WINDOW", str(48 * 3600 - 300)))
+MESSAGE_IDS_MAX = int(getenv("MESSAGE_IDS_MAX", "100"))
+
+
+def _coerce(value: Any) -> Any:
+    """Accept lists of plain ids saved before ids carried their send time"""
+    if not isinstance(value, list):
+        return value
+    now = int(time.time())
+    return [(item, now) if isinstance(item, int) else item for item in value]
+
+
+# (message_id, sent_at unix time) pairs, oldest first
+MessageIds = Annotated[list[tuple[int, int]], BeforeValidator(_coerce)]
+
+
+def track(message_ids: list[tuple[int, int]] | None, message_id: int, max_size: int = MESSAGE_IDS_MAX) -> list[tuple[int, int]]:
+    """Add a message id, dropping ids that can no longer be deleted and the oldest past max_size"""
+    message_ids = prune(message_ids)
+    message_ids.append((message_id, int(time.time())))
+    if len(message_ids) > max_size:
+        del message_ids[:len(message_ids) - max_size]
+    return message_ids
+
+
+def untrack(message_ids: list[tuple[int, int]] | None, message_id: int) -> list[tuple[int, int]] | None:
+    """Remove a message id if tracked"""
+    if message_ids is None:
+        return None
+    return [entry for entry in message_ids if entry[0] != message_id]
+
+
+def prune(message_ids: list[tuple[int, int]] | None) -> list[tuple[int, int]]:
+    """Drop ids older than the deletable window"""
+    if not message_ids:
+        return []
+    oldest = time.time() - DELETABLE_WINDOW
+    return [entry for entry in message_ids if entry[1] >= oldest]
+
+
+def is_deletable(sent_at: int) -> bool:
+    """True while Telegram still allows deleting a message sent at sent_at"""
+    return sent_at >= time.time() - DELETABLE_WINDOW
+
+
+def deletable_ids(message_ids: list[tuple[int, int]] | None) -> list[int]:
+    """Ids that Telegram still allows to delete"""
+    return [message_id for message_id, _ in prune(message_ids)]
+
+
+def ids(message_ids: list[tuple[int, int]] | None) -> list[int]:
+    """Every tracked id, oldest first"""
+    return [message_id for message_id, _ in message_ids or []]
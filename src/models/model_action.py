@@ -2,35 +2,34 @@ import asyncio
 from datetime import datetime
 from typing import Optional, Required
 
-from bot_instance import bot
-
 from models.base_state_model import BaseStateModel
+from models.message_ids import MessageIds
+import models.message_ids as message_ids
+from utils.deletion_queue import deletion_queue
 
 class ModelAction(BaseStateModel):
     current_action: Optional[str] = None
     action_data: Optional[dict] = {}
     action_started_at: Optional[datetime] = datetime.now()
     chat_id: Optional[int] = None
-    list_messages_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
 
-    def _get_state_key(self) -> str:
+    @classmethod
+    def _get_state_key(cls) -> str:
         return "action"
     
     def add_message_id(self, message_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
         self._auto_save_if_enabled()
 
     def unset_message_id(self, message_id: int) -> None:
         if self.list_messages_ids is not None:
-            self.list_messages_ids.remove(message_id)
+            self.list_messages_ids = message_ids.untrack(self.list_messages_ids, message_id)
             self._auto_save_if_enabled()
     
     async def delete_all_messages(self) -> None:
-        if self.list_messages_ids is not None and self.chat_id is not None:
-            # print("Deleting messages", self.list_messages_ids)
-            await bot.delete_messages(self.chat_id, self.list_messages_ids)
+        deletable = message_ids.deletable_ids(self.list_messages_ids)
+        deletion_queue.enqueue(self.chat_id, deletable)
         self.list_messages_ids = None
         self.chat_id = None
         self._auto_save_if_enabled()
@@ -1,29 +1,27 @@
-from contextlib import suppress
-
-from bot_instance import bot
 from .base_state_model import BaseStateModel
+from .message_ids import MessageIds
+import models.message_ids as message_ids
+from utils.deletion_queue import deletion_queue
 from typing import Optional
 
 class ModelLogin(BaseStateModel):
     username: Optional[str] = None
     password: Optional[str] = None
-    list_messages_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
     initiator_message_id: Optional[int] = None
     chat_id: Optional[int] = None
     
-    def _get_state_key(self) -> str:
+    @classmethod
+    def _get_state_key(cls) -> str:
         return "login"
     
     def add_message_id(self, message_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
         self._auto_save_if_enabled()
         
     async def delete_all_messages(self) -> None:
-        if self.list_messages_ids is not None:
-            with suppress(Exception):
-                await bot.delete_messages(self.chat_id, self.list_messages_ids)
+        deletable = message_ids.deletable_ids(self.list_messages_ids)
+        deletion_queue.enqueue(self.chat_id, deletable)
 
     def dump_data(self) -> dict:
         return {
@@ -2,10 +2,11 @@ from typing import Optional
 from pydantic import BaseModel
 from aiogram import types
 from aiogram.fsm.context import FSMContext
-from bot_instance import bot
-from contextlib import suppress
 import asyncio
 from .base_state_model import BaseStateModel
+from .message_ids import MessageIds
+import models.message_ids as message_ids
+from utils.deletion_queue import deletion_queue
 
 class ModelRegister(BaseStateModel):
     username: Optional[str] = None
@@ -14,7 +15,7 @@ class ModelRegister(BaseStateModel):
     bank_name: Optional[str] = None
     bank_account_name: Optional[str] = None
     bank_account_number: Optional[str] = None
-    list_messages_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
     chat_id: Optional[int] = None
     bank_list: Optional[list[str]] = None
     is_required_captcha: Optional[bool] = False
@@ -22,7 +23,8 @@ class ModelRegister(BaseStateModel):
     referral_code: Optional[str] = None
 
 
-    def _get_state_key(self) -> str:
+    @classmethod
+    def _get_state_key(cls) -> str:
         """Override to use 'register' as the state key"""
         return "register"
 
@@ -71,15 +73,12 @@ class ModelRegister(BaseStateModel):
         self._auto_save_if_enabled()
 
     def add_message_id(self, message_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
         self._auto_save_if_enabled()
 
     async def delete_all_messages(self) -> None:
-        if self.list_messages_ids is not None:
-            with suppress(Exception):
-                await bot.delete_messages(self.chat_id, self.list_messages_ids)
+        deletable = message_ids.deletable_ids(self.list_messages_ids)
+        deletion_queue.enqueue(self.chat_id, deletable)
 
     def get_submit_registration_data(self) -> dict:
         return {
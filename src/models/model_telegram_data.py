@@ -1,6 +1,8 @@
 from typing import Optional
 
 from .base_state_model import BaseStateModel
+from .message_ids import MessageIds
+import models.message_ids as message_ids
 
 '''
 Model to store telegram data
@@ -11,16 +13,15 @@ class ModelTelegramData(BaseStateModel):
     contact_phone: Optional[str] = None
     contact_name: Optional[str] = None
     user_id: Optional[int] = None
-    list_messages_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
     persistent_data: Optional[dict] = {}
     
-    def _get_state_key(self) -> str:
+    @classmethod
+    def _get_state_key(cls) -> str:
         return "telegram_data"
 
     def add_message_id(self, message_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
         self._auto_save_if_enabled()
 
     def set_persistent_data(self, key: str, value: any = None) -> None:
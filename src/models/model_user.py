@@ -4,9 +4,10 @@ from typing import Optional, Required
 from aiogram.fsm.context import FSMContext
 from pydantic import BaseModel
 from aiogram import types
-from bot_instance import bot
-from contextlib import suppress
 
+from models.message_ids import MessageIds
+import models.message_ids as message_ids
+from utils.deletion_queue import deletion_queue
 from models.model_deposit import DepositChannel
 from .base_state_model import BaseStateModel
 
@@ -21,7 +22,7 @@ class RekeningAdd(BaseModel):
     bank_name: Optional[str] = None
     bank_account_name: Optional[str] = None
     bank_account_number: Optional[str] = None
-    list_messages_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
     chat_id: Optional[int] = None
 
 class UserAction(BaseModel):
@@ -29,8 +30,8 @@ class UserAction(BaseModel):
     action_data: Optional[dict] = {}
     action_started_at: Optional[datetime] = datetime.now()
     chat_id: Optional[int] = None
-    list_messages_ids: Optional[list[int]] = None
-    list_menu_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
+    list_menu_ids: Optional[MessageIds] = None
 
     '''
     NOT FOR USE DIRECTLY, USE model_user.finish_action INSTEAD
@@ -51,32 +52,25 @@ class UserAction(BaseModel):
         return
 
     async def delete_all_messages(self) -> None:
-        if self.list_messages_ids is not None and self.chat_id is not None:
-            with suppress(Exception):
-                await bot.delete_messages(self.chat_id, self.list_messages_ids)
+        deletable = message_ids.deletable_ids(self.list_messages_ids)
+        deletion_queue.enqueue(self.chat_id, deletable)
         self.list_messages_ids = None
         self.chat_id = None
 
     def _add_menu_id(self, menu_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(menu_id)
-        if self.list_menu_ids is None:
-            self.list_menu_ids = []
-        self.list_menu_ids.append(menu_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, menu_id)
+        self.list_menu_ids = message_ids.track(self.list_menu_ids, menu_id)
 
     def unset_menu_id(self, menu_id: int) -> None:
         if self.list_menu_ids is not None:
-            self.list_menu_ids.remove(menu_id)
+            self.list_menu_ids = message_ids.untrack(self.list_menu_ids, menu_id)
 
     def _add_message_id(self, message_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
     
     def unset_message_id(self, message_id: int) -> None:
         if self.list_messages_ids is not None:
-            self.list_messages_ids.remove(message_id)
+            self.list_messages_ids = message_ids.untrack(self.list_messages_ids, message_id)
 
     def set_action_data(self, key: str, value: any) -> None:
         if self.action_data is None:
@@ -97,7 +91,7 @@ class ModelUser(BaseStateModel):
     rank: Optional[str] = None
     min_deposit: Optional[int] = None
     max_deposit: Optional[int] = None
-    list_messages_ids: Optional[list[int]] = None
+    list_messages_ids: Optional[MessageIds] = None
     is_authenticated: Optional[bool] = False
     chat_id: Optional[int] = None
     deposit_channels: Optional[list[DepositChannel]] = None
@@ -108,19 +102,18 @@ class ModelUser(BaseStateModel):
     status: Optional[str] = STATUS_ACTIVE
     show_rank: Optional[bool] = True
     
-    def _get_state_key(self) -> str:
+    @classmethod
+    def _get_state_key(cls) -> str:
         """Override to use 'user' as the state key"""
         return "user"
 
     def add_message_id(self, message_id: int) -> None:
-        if self.list_messages_ids is None:
-            self.list_messages_ids = []
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
         self._auto_save_if_enabled()
     
     def unset_message_id(self, message_id: int) -> None:
         if self.list_messages_ids is not None:
-            self.list_messages_ids.remove(message_id)
+            self.list_messages_ids = message_ids.untrack(self.list_messages_ids, message_id)
             self._auto_save_if_enabled()
 
     def set_username(self, value: str):
@@ -140,9 +133,8 @@ class ModelUser(BaseStateModel):
         self._auto_save_if_enabled()
 
     async def delete_all_messages(self) -> None:
-        if self.list_messages_ids is not None:
-            with suppress(Exception):
-                await bot.delete_messages(self.chat_id, self.list_messages_ids)
+        deletable = message_ids.deletable_ids(self.list_messages_ids)
+        deletion_queue.enqueue(self.chat_id, deletable)
 
     async def logout(self) -> None:
         await self.delete_all_messages()
@@ -161,7 +153,7 @@ class ModelUser(BaseStateModel):
         if self.temp_rekening_add is None: 
             raise Exception("Temp RekeningAdd model not initiated")
 
-        self.temp_rekening_add.list_messages_ids.append(message_id)
+        self.temp_rekening_add.list_messages_ids = message_ids.track(self.temp_rekening_add.list_messages_ids, message_id)
         self.add_message_id(message_id)
         self._auto_save_if_enabled()
         return
@@ -184,7 +176,7 @@ class ModelUser(BaseStateModel):
         if self.action is None:
             raise Exception("Action model not initiated")
         self.action._add_message_id(message_id)
-        self.list_messages_ids.append(message_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, message_id)
         self._auto_save_if_enabled()
 
     def add_action_menu_id(self, menu_id: int) -> None:
@@ -192,7 +184,7 @@ class ModelUser(BaseStateModel):
             raise Exception("Action model not initiated")
         self.action._add_menu_id(menu_id)
         self.action._add_message_id(menu_id)
-        self.list_messages_ids.append(menu_id)
+        self.list_messages_ids = message_ids.track(self.list_messages_ids, menu_id)
         self._auto_save_if_enabled()
 
     def is_active(self) -> bool:
@@ -2,19 +2,27 @@
 Simple OTP API Client
 """
 import hashlib
-import json
 import asyncio
 import aiohttp
 from typing import Dict, Any, Optional
 from .models import APIResponse
 from .decorators import authenticated
-from .exceptions import InvalidSessionError
+from .exceptions import InvalidSessionError, OTPResponseError
+from .http_pool import get_http_pool
+from .cookie_store import CookieStore
+from .session_cache import session_cache
+from .singleflight import SingleFlight
+from .retry import RetryPolicy, MUTATION_RETRY_POLICY, READ_RETRY_POLICY
 from aiogram.fsm.context import FSMContext
 from yarl import URL
 from utils.logger import get_logger
+import utils.metrics as metrics
 
 logger = get_logger()
 
+# Coalesces identical requests to endpoints that return the same data for every user
+shared_requests = SingleFlight("otp.shared_requests")
+
 class OTPAPIClient:
     """Simple OTP API Client with aiohttp"""
     
@@ -23,6 +31,7 @@ class OTPAPIClient:
         self.base_url = base_url
         self.state = state
         self.cookie_jar = aiohttp.CookieJar()  # Initialize empty cookie jar
+        self.cookie_store = CookieStore(state)
         self.headers = {
             "X-Telegram-User-Id": str(self.telegram_id),
             "Content-Type": "application/json",
@@ -43,10 +52,9 @@ class OTPAPIClient:
             del self.headers[key]
     
     async def _load_cookies_from_state(self) -> aiohttp.CookieJar:
-        """Load cookies from FSMContext state"""
+        """Load cookies from the cookie store"""
         try:
-            fsm_data = await self.state.get_data()
-            cookie_data = fsm_data.get("cookie_jar", {})
+            cookie_data = await self.cookie_store.load()
             
             if not cookie_data:
                 return aiohttp.CookieJar()
@@ -62,20 +70,25 @@ class OTPAPIClient:
             return aiohttp.CookieJar()
     
     async def _save_cookies_to_state(self, cookie_jar: aiohttp.CookieJar):
-        """Save cookies to FSMContext state"""
+        """Save cookies to the cookie store, only when they changed"""
         try:
             cookie_data = {}
             for cookie in cookie_jar:
                 cookie_data[cookie.key] = cookie.value
             
-            await self.state.update_data(cookie_jar=cookie_data)
+            await self.cookie_store.save(cookie_data)
         except Exception as e:
             logger.warning(f"Failed to save cookies: {e}")
     
     async def clear_cookies(self):
         """Clear all cookies and update state"""
         self.cookie_jar.clear()
-        await self.state.update_data(cookie_jar={})
+        self.invalidate_session()
+        await self.cookie_store.clear()
+
+    def invalidate_session(self):
+        """Drop the cached `me()` result of this user"""
+        session_cache.invalidate(self.base_url, self.telegram_id)
     
     async def _has_required_cookies(self) -> bool:
         """Check if required authentication cookies are present"""
@@ -92,74 +105,132 @@ class OTPAPIClient:
         # Ensure cookies are loaded from state
         return await self._has_required_cookies()
     
-    async def _make_request(self, method: str, endpoint: str, data: Dict[str, Any] = None, custom_headers: Dict[str, str] = None) -> APIResponse:
-        """Make HTTP request and return APIResponse"""
+    def _shared_headers(self) -> Dict[str, str]:
+        """Headers without the user's identity, for responses shared between users"""
+        return {key: value for key, value in self.headers.items() if key != "X-Telegram-User-Id"}
+
+    async def _send_once(self, method: str, url: str, headers: Dict[str, str], data: Dict[str, Any] = None, with_cookies: bool = True) -> tuple[int, dict]:
+        """Send a single HTTP request and return (status, json body)"""
+        # Shared pooled session, cookies are sent and collected per user
+        session = await get_http_pool().session()
+        async with session.request(
+            method=method,
+            url=url,
+            headers=headers,
+            json=data,
+            cookies=self.cookie_jar.filter_cookies(URL(url)) if with_cookies else None,
+        ) as response:
+            if with_cookies:
+                self.cookie_jar.update_cookies(response.cookies, response.url)
+                # Save cookies from response to state
+                await self._save_cookies_to_state(self.cookie_jar)
+            try:
+                response_data = await response.json()
+            except Exception as e:
+                raise OTPResponseError(response.status, e) from e
+            return response.status, response_data
+
+    async def _make_request(self, method: str, endpoint: str, data: Dict[str, Any] = None, custom_headers: Dict[str, str] = None, retry_policy: RetryPolicy = None, shared: bool = False) -> APIResponse:
+        """
+        Make HTTP request and return APIResponse, retrying according to the retry policy.
+        Shared requests are sent without the user's id header and cookies, and keep no cookies.
+        """
         # Merge custom headers with default headers
-        headers = self.headers.copy()
+        headers = self._shared_headers() if shared else self.headers.copy()
         if custom_headers:
             headers.update(custom_headers)
-        if not self.cookie_jar:
+        if not shared and not self.cookie_jar:
             self.cookie_jar = await self._load_cookies_from_state()
-        
-        http_response = None
-        try:
-            # Use persistent session with cookie jar
-            async with aiohttp.ClientSession(cookie_jar=self.cookie_jar) as session:
-                async with session.request(
-                    method=method,
-                    url=f"{self.base_url}{endpoint}",
-                    headers=headers,
-                    json=data,
-                ) as response:
-                    # Save cookies from response to state
-                    await self._save_cookies_to_state(self.cookie_jar)
-                    http_response = response
-                    response_data = await response.json()
-                    if response.status == 412:
-                        logger.warning(f"412 error {response_data.get('error', {}).get('message', 'Unknown error')}, retrying request to {self.base_url}{endpoint}")
-                        return await self._make_request(method, endpoint, data, custom_headers)
+
+        policy = retry_policy or MUTATION_RETRY_POLICY
+        url = f"{self.base_url}{endpoint}"
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        attempt = 1
+        while True:
+            try:
+                status, response_data = await self._send_once(method, url, headers, data, with_cookies=not shared)
+                if not shared and (status == 401 or response_data.get('error', {}).get('code') == 401):
+                    self.invalidate_session()
+                if not policy.is_retryable_status(status):
                     return APIResponse(response_data)
-        except Exception as e:
-            md5_hash = hashlib.md5(str(e).encode()).hexdigest()
-            # Return error response for network issues
-            error_response = {
-                "error": {
-                    "code": 500,
-                    "message": f"Mohon hubungi admin\nKode error: <code>{md5_hash}</code>"
-                },
-                "data": None,
-                "metadata": {}
-            }
-            logger.error("--------------------------------")
-            logger.error(f"Telegram ID: {self.telegram_id}")
-            logger.error(f"URL: {self.base_url}{endpoint}")
-            logger.error(f"METHOD: {method}")
-            logger.error(f"DATA: {data}")
-            logger.error(f"HEADERS: {json.dumps(headers, indent=2)}")
-            logger.error(f"CUSTOM HEADERS: {custom_headers}")
-            logger.error(f"ERROR HASH: {md5_hash}")
-            logger.error(f"ERROR: {e}")
-            logger.error(f"Cookie Jar: {self.cookie_jar.__dict__}")
-            if http_response and hasattr(http_response, 'status'):
-                logger.error(f"HTTP Response Status: {http_response.status}")
-            return APIResponse(error_response)
+                delay = policy.next_delay(attempt, loop.time() - started_at)
+                if delay is None:
+                    metrics.incr(f"otp.retry_exhausted.{status}")
+                    logger.warning(f"{status} error {response_data.get('error', {}).get('message', 'Unknown error')}, giving up on {url} after {attempt} attempts")
+                    return APIResponse(response_data)
+                metrics.incr(f"otp.retry.{status}")
+                logger.warning(f"{status} error {response_data.get('error', {}).get('message', 'Unknown error')}, retrying request to {url} in {delay:.2f}s (attempt {attempt})")
+            except Exception as e:
+                delay = None
+                if policy.is_retryable_exception(e):
+                    delay = policy.next_delay(attempt, loop.time() - started_at)
+                if delay is None:
+                    return self._error_response(method, endpoint, data, headers, custom_headers, e)
+                metrics.incr(f"otp.retry.{type(e).__name__}")
+                logger.warning(f"{type(e).__name__} on {url}, retrying in {delay:.2f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _make_shared_request(self, method: str, endpoint: str, retry_policy: RetryPolicy = READ_RETRY_POLICY) -> APIResponse:
+        """Make an idempotent, non user-specific request, sharing it with identical concurrent callers"""
+        return await shared_requests.do(
+            (self.base_url, method, endpoint),
+            lambda: self._make_request(method, endpoint, retry_policy=retry_policy, shared=True),
+        )
+
+    def _error_response(self, method: str, endpoint: str, data: Dict[str, Any], headers: Dict[str, str], custom_headers: Dict[str, str], e: Exception) -> APIResponse:
+        """Log a failed request and build the generic error APIResponse"""
+        md5_hash = hashlib.md5(str(e).encode()).hexdigest()
+        # Return error response for network issues
+        error_response = {
+            "error": {
+                "code": 500,
+                "message": f"Mohon hubungi admin\nKode error: <code>{md5_hash}</code>"
+            },
+            "data": None,
+            "metadata": {}
+        }
+        metrics.incr("otp.request_failed")
+        # One line, details as fields of the JSON log, header values and cookies stay out of the logs
+        logger.error(
+            "OTP request failed: %s %s%s for %s, %s (hash %s)",
+            method, self.base_url, endpoint, self.telegram_id, e, md5_hash,
+            extra={
+                "telegram_id": self.telegram_id,
+                "url": f"{self.base_url}{endpoint}",
+                "method": method,
+                "data_keys": sorted(data) if data else [],
+                "header_names": sorted(headers),
+                "custom_headers": sorted(custom_headers) if custom_headers else [],
+                "cookie_names": sorted({cookie.key for cookie in self.cookie_jar}) if self.cookie_jar else [],
+                "error_hash": md5_hash,
+                "error_type": type(e).__name__,
+                "http_status": e.status if isinstance(e, OTPResponseError) else None,
+            },
+        )
+        return APIResponse(error_response)
     
 
     async def get_server_info(self) -> APIResponse:
         """GET request to /api/v1/telegram/server/info"""
-        return await self._make_request("GET", "/api/v1/telegram/server/info")
+        return await self._make_shared_request("GET", "/api/v1/telegram/server/info")
 
     async def get_social_media(self) -> APIResponse:
         """GET request to /api/v1/telegram/server/social-media"""
-        return await self._make_request("GET", "/api/v1/telegram/server/social-media")
+        return await self._make_shared_request("GET", "/api/v1/telegram/server/social-media")
 
     async def logout(self) -> APIResponse:
         """POST request to /api/v1/telegram/logout"""
-        return await self._make_request("POST", "/api/v1/telegram/logout")
+        response = await self._make_request("POST", "/api/v1/telegram/logout")
+        self.invalidate_session()
+        return response
     
     async def submit_login(self, data: Dict[str, Any]) -> APIResponse:
         """POST request to /api/v1/telegram/login"""
-        return await self._make_request("POST", "/api/v1/telegram/login", data)
+        response = await self._make_request("POST", "/api/v1/telegram/login", data)
+        self.invalidate_session()
+        return response
 
     async def submit_registration(self, data: Dict[str, Any]) -> APIResponse:
         """POST request to /api/v1/telegram/register"""
@@ -171,18 +242,18 @@ class OTPAPIClient:
 
     async def list_active_bank(self) -> APIResponse:
         """GET request to /api/v1/telegram/bank"""
-        return await self._make_request("GET", "/api/v1/telegram/bank")
+        return await self._make_shared_request("GET", "/api/v1/telegram/bank")
 
 
     @authenticated
     async def me(self) -> APIResponse:
         """GET request to /api/v1/telegram/me - requires authentication"""
-        return await self._make_request("POST", "/api/v1/telegram/me")
+        return await self._make_request("POST", "/api/v1/telegram/me", retry_policy=READ_RETRY_POLICY)
 
     @authenticated
     async def list_rekening(self) -> APIResponse:
         """GET request to /api/v1/telegram/me/rekening"""
-        return await self._make_request("GET", "/api/v1/telegram/me/rekening")
+        return await self._make_request("GET", "/api/v1/telegram/me/rekening", retry_policy=READ_RETRY_POLICY)
     
     @authenticated
     async def initiate_rekening_add(self) -> APIResponse:
@@ -205,7 +276,7 @@ class OTPAPIClient:
         data = {
             "search": search_query
         }
-        return await self._make_request("POST", f"/api/v1/telegram/game/search?page={page}", data)
+        return await self._make_request("POST", f"/api/v1/telegram/game/search?page={page}", data, retry_policy=READ_RETRY_POLICY)
         
     @authenticated
     async def get_game_url(self, game_code: str, provider_id: str) -> APIResponse:
@@ -219,7 +290,7 @@ class OTPAPIClient:
     @authenticated
     async def list_deposit_payment_channel(self) -> APIResponse:
         """POST request to /api/v1/telegram/deposiy-payment-channel"""
-        return await self._make_request("POST", "/api/v1/telegram/bank/deposit-payment-channel")
+        return await self._make_request("POST", "/api/v1/telegram/bank/deposit-payment-channel", retry_policy=READ_RETRY_POLICY)
 
     @authenticated
     async def initiate_withdraw(self, amount: int) -> APIResponse:
@@ -236,7 +307,9 @@ class OTPAPIClient:
             "jumlahwd": amount,
             "catatanwd": notes
         }
-        return await self._make_request("POST", "/api/v1/telegram/me/withdraw/confirm", data)
+        response = await self._make_request("POST", "/api/v1/telegram/me/withdraw/confirm", data)
+        self.invalidate_session()
+        return response
 
     @authenticated
     async def initiate_deposit(self) -> APIResponse:
@@ -253,7 +326,9 @@ class OTPAPIClient:
             "catatan": notes,
             "promo": str(promo_id) if promo_id is not None else "0",
         }
-        return await self._make_request("POST", "/api/v1/telegram/me/deposit/confirm/bank", data)
+        response = await self._make_request("POST", "/api/v1/telegram/me/deposit/confirm/bank", data)
+        self.invalidate_session()
+        return response
 
     @authenticated
     async def confirm_deposit_payment_gateway(self, payment_gateway_id: int, amount: int, type: str):
@@ -263,24 +338,26 @@ class OTPAPIClient:
             'jumlahpgw': amount,
             'type': type
         }
-        return await self._make_request("POST", "/api/v1/telegram/me/deposit/confirm/payment-gateway", data)
+        response = await self._make_request("POST", "/api/v1/telegram/me/deposit/confirm/payment-gateway", data)
+        self.invalidate_session()
+        return response
 
     @authenticated
     async def show_deposit_withdraw_history(self, page: int = 1) -> APIResponse:
         """GET request to /api/v1/telegram/me/transaction/deposit-withdraw"""
-        return await self._make_request("GET", f"/api/v1/telegram/me/transaction/deposit-withdraw?page={page}")
+        return await self._make_request("GET", f"/api/v1/telegram/me/transaction/deposit-withdraw?page={page}", retry_policy=READ_RETRY_POLICY)
 
     async def list_games_by_type(self, game_type = "all", page: int = 1) -> APIResponse:
         """GET request to /api/v1/telegram/game/{game_type}?page={page}"""
-        return await self._make_request("GET", f"/api/v1/telegram/game/{game_type}?page={page}")
+        return await self._make_shared_request("GET", f"/api/v1/telegram/game/{game_type}?page={page}")
 
     async def list_games_by_type_and_provider(self, game_type: str, provider_id: str, page: int = 1) -> APIResponse:
         """GET request to /api/v1/telegram/game/{game_type}/{provider_id}?page={page}"""
-        return await self._make_request("GET", f"/api/v1/telegram/game/{game_type}/{provider_id}?page={page}")
+        return await self._make_shared_request("GET", f"/api/v1/telegram/game/{game_type}/{provider_id}?page={page}")
 
     async def list_providers(self, game_type = "all") -> APIResponse:
         """GET request to /api/v1/telegram/provider"""
-        return await self._make_request("GET", f"/api/v1/telegram/provider/{game_type}")
+        return await self._make_shared_request("GET", f"/api/v1/telegram/provider/{game_type}")
 
 
     
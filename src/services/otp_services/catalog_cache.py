@@ -0,0 +1,127 @@
+"""
+Shared game catalog cache backed by Redis
+"""
+import asyncio
+import json
+import time
+from os import getenv
+from typing import Awaitable, Callable
+from redis.asyncio import Redis
+from .models import APIResponse
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+CATALOG_CACHE_TTL = int(getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_STALE_TTL = int(getenv("CATALOG_CACHE_STALE_TTL", "3600"))
+
+
+class CatalogCache:
+    """
+    Caches game list pages for every user of a site.
+
+    Pages younger than `ttl` are served straight from Redis. Older pages are
+    still served for up to `stale_ttl` more seconds while a single background
+    refresh fetches a fresh copy (stale-while-revalidate).
+    """
+
+    def __init__(self, redis: Redis, web_id: str, ttl: int = CATALOG_CACHE_TTL, stale_ttl: int = CATALOG_CACHE_STALE_TTL):
+        self.redis = redis
+        self.web_id = web_id
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._listeners: list[Callable[[str, str | None, dict], None]] = []
+
+    def add_listener(self, listener: Callable[[str, str | None, dict], None]):
+        """Call listener(game_type, provider_id, data) every time a page is fetched from upstream"""
+        self._listeners.append(listener)
+
+    def _key(self, game_type: str, provider_id: str | None, page: int) -> str:
+        return f"{self.web_id}:catalog:games:{game_type}:{provider_id or '*'}:{page}"
+
+    async def get_games(self, api_client, game_type: str, provider_id: str = "all", page: int = 1) -> APIResponse:
+        """Get a page of `list_games_by_type_and_provider`, from cache when possible"""
+        return await self._get(
+            self._key(game_type, provider_id, page),
+            lambda: api_client.list_games_by_type_and_provider(game_type, provider_id, page),
+            (game_type, provider_id),
+        )
+
+    async def get_games_by_type(self, api_client, game_type: str = "all", page: int = 1) -> APIResponse:
+        """Get a page of `list_games_by_type`, from cache when possible"""
+        return await self._get(
+            self._key(game_type, None, page),
+            lambda: api_client.list_games_by_type(game_type, page),
+            (game_type, None),
+        )
+
+    async def warm(self, api_client, game_type: str, provider_id: str = "all", page: int = 1) -> bool:
+        """Make sure a page is cached and fresh, returns True when it was fetched and cached"""
+        key = self._key(game_type, provider_id, page)
+        entry = await self._read(key)
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            return False
+        response = await self._fetch_and_store(
+            key,
+            lambda: api_client.list_games_by_type_and_provider(game_type, provider_id, page),
+            (game_type, provider_id),
+        )
+        # An error response is not cached, the prefetch did not happen
+        return response.success
+
+    async def _get(self, key: str, fetch: Callable[[], Awaitable[APIResponse]], source: tuple[str, str | None]) -> APIResponse:
+        entry = await self._read(key)
+        if entry is None:
+            metrics.incr("catalog.miss")
+            return await self._fetch_and_store(key, fetch, source)
+
+        if time.time() - entry["fetched_at"] < self.ttl:
+            metrics.incr("catalog.hit")
+        else:
+            metrics.incr("catalog.stale")
+            self._refresh_in_background(key, fetch, source)
+        return APIResponse(entry["response"])
+
+    async def _read(self, key: str) -> dict | None:
+        try:
+            raw = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Catalog cache read failed for {key}: {e}")
+            return None
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[APIResponse]], source: tuple[str, str | None]) -> APIResponse:
+        response = await fetch()
+        if response.success:
+            entry = {"fetched_at": time.time(), "response": response.raw}
+            try:
+                await self.redis.set(key, json.dumps(entry), ex=self.ttl + self.stale_ttl)
+            except Exception as e:
+                logger.warning(f"Catalog cache write failed for {key}: {e}")
+            self._notify(source, response.data)
+        return response
+
+    def _notify(self, source: tuple[str, str | None], data: dict):
+        game_type, provider_id = source
+        for listener in self._listeners:
+            try:
+                listener(game_type, provider_id, data)
+            except Exception as e:
+                logger.warning(f"Catalog cache listener failed: {e}")
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Awaitable[APIResponse]], source: tuple[str, str | None]):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._fetch_and_store(key, fetch, source))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def invalidate(self):
+        """Drop every cached page of this site"""
+        keys = [key async for key in self.redis.scan_iter(match=f"{self.web_id}:catalog:games:*")]
+        if keys:
+            await self.redis.delete(*keys)
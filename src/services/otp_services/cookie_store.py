@@ -0,0 +1,96 @@
+"""
+Per-user OTP session cookie persistence
+"""
+import json
+from os import getenv
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.redis import RedisStorage
+import utils.metrics as metrics
+from utils.unit_of_work import get_state_data, invalidate_state_data
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Should match the backend session lifetime, refreshed every time cookies are read
+COOKIE_TTL = int(getenv("OTP_COOKIE_TTL", "86400"))
+
+# Cookies used to live inside the FSM data blob under this key
+LEGACY_STATE_KEY = "cookie_jar"
+
+
+class CookieStore:
+    """
+    Stores a user's cookies in a small dedicated Redis key with a TTL.
+
+    Writes are skipped when the cookies did not change since they were last
+    loaded or saved. Storages other than RedisStorage fall back to FSM data.
+    """
+
+    def __init__(self, state: FSMContext | None, ttl: int = COOKIE_TTL):
+        self.state = state
+        self.ttl = ttl
+        self._persisted: dict[str, str] | None = None
+
+    def _redis_target(self):
+        """Get (redis, key) when the state is backed by RedisStorage"""
+        if self.state is None or not isinstance(self.state.storage, RedisStorage):
+            return None
+        storage: RedisStorage = self.state.storage
+        return storage.redis, storage.key_builder.build(self.state.key, "cookies")
+
+    async def load(self) -> dict[str, str]:
+        """Load cookies, migrating them out of FSM data if needed"""
+        if self.state is None:
+            return {}
+        target = self._redis_target()
+        if target is not None:
+            redis, key = target
+            raw = await redis.getex(key, ex=self.ttl)
+            if raw is not None:
+                cookies = json.loads(raw)
+                self._persisted = dict(cookies)
+                return cookies
+
+        fsm_data = await get_state_data(self.state)
+        cookies = fsm_data.get(LEGACY_STATE_KEY) or {}
+        if target is None:
+            self._persisted = dict(cookies)
+        elif cookies:
+            # Move legacy cookies to their own key and drop them from the data blob
+            await self._write(cookies)
+            await self.state.update_data(**{LEGACY_STATE_KEY: None})
+            invalidate_state_data(self.state)
+            metrics.incr("cookie.migrated")
+        else:
+            self._persisted = {}
+        return cookies
+
+    async def save(self, cookies: dict[str, str]) -> bool:
+        """Persist cookies if they changed, returns True when a write happened"""
+        if self.state is None:
+            return False
+        if cookies == self._persisted:
+            metrics.incr("cookie.write_skipped")
+            return False
+        await self._write(cookies)
+        return True
+
+    async def _write(self, cookies: dict[str, str]):
+        target = self._redis_target()
+        if target is not None:
+            redis, key = target
+            if cookies:
+                await redis.set(key, json.dumps(cookies), ex=self.ttl)
+            else:
+                await redis.delete(key)
+        else:
+            await self.state.update_data(**{LEGACY_STATE_KEY: cookies})
+            invalidate_state_data(self.state)
+        self._persisted = dict(cookies)
+        metrics.incr("cookie.write")
+
+    async def clear(self):
+        """Remove every stored cookie"""
+        if self.state is None:
+            return
+        await self._write({})
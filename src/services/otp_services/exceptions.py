@@ -17,3 +17,11 @@ class OTPValidationError(OTPAPIError):
 class OTPTimeoutError(OTPAPIError):
     """Raised when OTP request times out"""
     pass
+
+
+class OTPResponseError(OTPAPIError):
+    """Raised when the OTP API response cannot be decoded"""
+
+    def __init__(self, status: int, error: Exception):
+        super().__init__(f"HTTP {status}: {error}")
+        self.status = status
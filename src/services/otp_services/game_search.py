@@ -0,0 +1,269 @@
+"""
+Local game search index built from the game catalog
+"""
+import asyncio
+import bisect
+import math
+import re
+from os import getenv
+from models.model_games import GAME_TYPES
+from .models import APIResponse
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+GAME_SEARCH_PAGE_SIZE = int(getenv("GAME_SEARCH_PAGE_SIZE", "10"))
+GAME_SEARCH_SYNC_INTERVAL = int(getenv("GAME_SEARCH_SYNC_INTERVAL", "1800"))
+GAME_SEARCH_MAX_SYNC_PAGES = int(getenv("GAME_SEARCH_MAX_SYNC_PAGES", "200"))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Score of a query token against an indexed word
+SCORE_EXACT = 3.0
+SCORE_PREFIX = 2.0
+SCORE_FUZZY = 1.0
+MIN_FUZZY_SIMILARITY = 0.4
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Lowercase ASCII words of a text"""
+    if not text:
+        return []
+    return _WORD_RE.findall(text.lower())
+
+
+def trigrams(word: str) -> set[str]:
+    """Trigrams of a word, padded so short words still produce some"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Document:
+    __slots__ = ("game", "words", "name", "generation")
+
+    def __init__(self, game: dict, words: frozenset[str], name: str, generation: int):
+        self.game = game
+        self.words = words
+        self.name = name
+        self.generation = generation
+
+
+class GameSearchIndex:
+    """
+    Inverted word index with a trigram index over the vocabulary.
+
+    A query token matches an indexed word exactly, as a prefix, or fuzzily
+    through trigram similarity (typos). A game matches when every query token
+    matches one of its words; results are ranked by the summed token scores.
+    """
+
+    def __init__(self, page_size: int = GAME_SEARCH_PAGE_SIZE):
+        self.page_size = page_size
+        self.provider_names: dict[str, str] = {}
+        self._documents: dict[tuple, _Document] = {}
+        self._postings: dict[str, set[tuple]] = {}
+        self._vocabulary: list[str] = []
+        self._trigrams: dict[str, set[str]] = {}
+        self._generation = 0
+        self._ready = False
+
+    @property
+    def ready(self) -> bool:
+        """True once a full catalog sync has completed"""
+        return self._ready
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    # Indexing
+
+    def set_provider_names(self, names: dict[str, str]):
+        """Register provider names so games can be found by provider"""
+        self.provider_names.update(names)
+
+    def upsert_games(self, games: list[dict], provider_name: str | None = None):
+        """Add or update games in the index"""
+        for game in games:
+            if not game:
+                continue
+            doc_id = (game.get("game_type"), game.get("provider_id"), game.get("game_code"), game.get("game_id"))
+            provider_id = game.get("provider_id")
+            if provider_name and provider_id and provider_id not in self.provider_names:
+                self.provider_names[provider_id] = provider_name
+            words = frozenset(
+                tokenize(game.get("game_name"))
+                + tokenize(self.provider_names.get(provider_id, provider_id))
+                + tokenize(game.get("game_type"))
+            )
+            name = (game.get("game_name") or "").lower()
+            existing = self._documents.get(doc_id)
+            if existing is not None:
+                if existing.words != words:
+                    self._unlink(doc_id, existing.words - words)
+                    self._link(doc_id, words - existing.words)
+                existing.game = game
+                existing.words = words
+                existing.name = name
+                existing.generation = self._generation
+            else:
+                self._documents[doc_id] = _Document(game, words, name, self._generation)
+                self._link(doc_id, words)
+
+    def on_catalog_page(self, game_type: str, provider_id: str | None, data: dict):
+        """CatalogCache listener, keeps the index fresh as pages are refreshed"""
+        if not data:
+            return
+        provider_name = data.get("provider_name") if provider_id not in (None, "all") else None
+        self.upsert_games(data.get("games") or [], provider_name)
+
+    def _link(self, doc_id: tuple, words):
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                self._postings[word] = postings = set()
+                bisect.insort(self._vocabulary, word)
+                for gram in trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            postings.add(doc_id)
+
+    def _unlink(self, doc_id: tuple, words):
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+                for gram in trigrams(word):
+                    grams = self._trigrams.get(gram)
+                    if grams is not None:
+                        grams.discard(word)
+                        if not grams:
+                            del self._trigrams[gram]
+
+    def begin_sync(self) -> int:
+        """Start a full sync, documents not upserted before end_sync are removed"""
+        self._generation += 1
+        return self._generation
+
+    def end_sync(self, generation: int):
+        """Finish a full sync and drop games that disappeared from the catalog"""
+        stale = [doc_id for doc_id, doc in self._documents.items() if doc.generation < generation]
+        for doc_id in stale:
+            self._unlink(doc_id, self._documents.pop(doc_id).words)
+        self._ready = True
+        logger.info(f"Game search index synced: {len(self._documents)} games, {len(stale)} removed")
+
+    # Querying
+
+    def _match_token(self, token: str) -> dict[str, float]:
+        """Indexed words matching a query token, with their score"""
+        matches: dict[str, float] = {}
+        if token in self._postings:
+            matches[token] = SCORE_EXACT
+
+        vocabulary = self._vocabulary
+        index = bisect.bisect_left(vocabulary, token)
+        while index < len(vocabulary) and vocabulary[index].startswith(token):
+            matches.setdefault(vocabulary[index], SCORE_PREFIX)
+            index += 1
+
+        if len(token) >= 3:
+            token_grams = trigrams(token)
+            overlap: dict[str, int] = {}
+            for gram in token_grams:
+                for word in self._trigrams.get(gram, ()):
+                    overlap[word] = overlap.get(word, 0) + 1
+            for word, common in overlap.items():
+                if word in matches:
+                    continue
+                similarity = common / (len(token_grams) + len(trigrams(word)) - common)
+                if similarity >= MIN_FUZZY_SIMILARITY:
+                    matches[word] = SCORE_FUZZY * similarity
+        return matches
+
+    def search(self, query: str, page: int = 1) -> dict:
+        """Search games, returns data shaped like the `game/search` endpoint"""
+        with metrics.timer("game_search.local"):
+            tokens = tokenize(query)
+            scores: dict[tuple, float] | None = None
+            for token in tokens:
+                token_scores: dict[tuple, float] = {}
+                for word, score in self._match_token(token).items():
+                    for doc_id in self._postings[word]:
+                        if score > token_scores.get(doc_id, 0):
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items() if doc_id in scores}
+                if not scores:
+                    break
+
+            ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], self._documents[item[0]].name))
+            total = len(ranked)
+            last_page = max(1, math.ceil(total / self.page_size))
+            page = max(1, page)
+            offset = (page - 1) * self.page_size
+            games = [self._documents[doc_id].game for doc_id, _ in ranked[offset:offset + self.page_size]]
+        metrics.incr("game_search.local")
+        return {
+            "games": games,
+            "pagination": {
+                "total": total,
+                "perPage": self.page_size,
+                "currentPage": page,
+                "lastPage": last_page,
+                "hasMore": page < last_page,
+            },
+        }
+
+    async def search_or_fetch(self, api_client, query: str, page: int = 1) -> APIResponse:
+        """Search locally once the index is ready, otherwise ask the OTP API"""
+        if not self._ready:
+            metrics.incr("game_search.upstream")
+            return await api_client.search_games(query, page)
+        return APIResponse({"error": {"code": 200}, "data": self.search(query, page), "metadata": {}})
+
+    # Catalog sync
+
+    async def sync(self, catalog_cache, api_client, provider_catalog=None):
+        """Walk every game type of the catalog and rebuild the index"""
+        generation = self.begin_sync()
+        if provider_catalog is not None:
+            self.set_provider_names(provider_catalog.provider_names())
+        for game_type in GAME_TYPES:
+            if provider_catalog is None:
+                providers = await api_client.list_providers(game_type)
+                if providers.success:
+                    self.set_provider_names({
+                        provider["provider_id"]: provider.get("provider_name") or ""
+                        for provider in providers.data.get("providers", [])
+                        if provider is not None and provider.get("provider_id")
+                    })
+
+            page = 1
+            while page <= GAME_SEARCH_MAX_SYNC_PAGES:
+                response = await catalog_cache.get_games(api_client, game_type, "all", page)
+                if response.is_error:
+                    # Keep the previous documents rather than dropping a whole game type
+                    logger.warning(f"Game search sync failed for {game_type} page {page}: {response.get_error_message()}")
+                    return
+                self.upsert_games(response.data.get("games") or [])
+                if not response.data.get("pagination", {}).get("hasMore"):
+                    break
+                page += 1
+        self.end_sync(generation)
+
+    async def run(self, catalog_cache, api_client, provider_catalog=None, interval: int = GAME_SEARCH_SYNC_INTERVAL):
+        """Keep the index synced with the catalog forever"""
+        while True:
+            try:
+                await self.sync(catalog_cache, api_client, provider_catalog)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Game search sync crashed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,74 @@
+"""
+Shared HTTP connection pool for the OTP API
+"""
+import aiohttp
+from utils.logger import get_logger
+
+logger = get_logger()
+
+
+class HTTPPool:
+    """Process-wide aiohttp session with keep-alive connections and DNS cache"""
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 30,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        request_timeout: float = 30,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.request_timeout = request_timeout
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Create the underlying session if it does not exist yet"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            # Cookies are kept per Telegram user by OTPAPIClient, never on the shared session
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+            logger.info(f"HTTP pool ready (limit={self.limit}, per_host={self.limit_per_host}, keepalive={self.keepalive_timeout}s)")
+        return self._session
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Get the shared session, creating it lazily when needed"""
+        if self._session is None or self._session.closed:
+            return await self.start()
+        return self._session
+
+    async def close(self):
+        """Close the session and every pooled connection"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_http_pool: HTTPPool | None = None
+
+
+def set_http_pool(pool: HTTPPool):
+    """Register the process-wide HTTP pool"""
+    global _http_pool
+    _http_pool = pool
+
+
+def get_http_pool() -> HTTPPool:
+    """Get the process-wide HTTP pool, creating a default one if none was registered"""
+    global _http_pool
+    if _http_pool is None:
+        _http_pool = HTTPPool()
+    return _http_pool
@@ -0,0 +1,98 @@
+"""
+Predictive prefetch of game list pages
+"""
+import asyncio
+import time
+from os import getenv
+from .catalog_cache import CatalogCache
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+CATALOG_PREFETCH_ENABLED = str(getenv("CATALOG_PREFETCH_ENABLED", "true")).lower() == "true"
+CATALOG_PREFETCH_PREVIOUS = str(getenv("CATALOG_PREFETCH_PREVIOUS", "false")).lower() == "true"
+CATALOG_PREFETCH_CONCURRENCY = int(getenv("CATALOG_PREFETCH_CONCURRENCY", "4"))
+
+
+class PagePrefetcher:
+    """
+    Warms the catalog cache with the pages a user is likely to open next.
+
+    At most `concurrency` prefetches run at once. When every slot is busy new
+    prefetches are dropped instead of queued, so they never compete with
+    interactive requests for long.
+    """
+
+    def __init__(
+        self,
+        catalog_cache: CatalogCache,
+        api_client,
+        enabled: bool = CATALOG_PREFETCH_ENABLED,
+        prefetch_previous: bool = CATALOG_PREFETCH_PREVIOUS,
+        concurrency: int = CATALOG_PREFETCH_CONCURRENCY,
+    ):
+        self.catalog_cache = catalog_cache
+        self.api_client = api_client
+        self.enabled = enabled
+        self.prefetch_previous = prefetch_previous
+        self.concurrency = concurrency
+        self.issued = 0
+        self.hits = 0
+        self._running: set[asyncio.Task] = set()
+        self._pending: set[tuple] = set()
+        self._prefetched: dict[tuple, float] = {}
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of prefetched pages that were opened afterwards"""
+        return self.hits / self.issued if self.issued else 0.0
+
+    def record_access(self, game_type: str, provider_id: str, page: int):
+        """Tell the prefetcher a page was opened, counts a hit if it was prefetched"""
+        if not self._prefetched:
+            return
+        fetched_at = self._prefetched.pop((game_type, provider_id, page), None)
+        if fetched_at is not None and time.monotonic() - fetched_at < self.catalog_cache.ttl:
+            self.hits += 1
+            metrics.incr("catalog.prefetch.hit")
+
+    def schedule(self, game_type: str, provider_id: str, page: int, has_more: bool):
+        """Prefetch the neighbours of a page that was just rendered"""
+        if not self.enabled:
+            return
+        pages = []
+        if has_more:
+            pages.append(page + 1)
+        if self.prefetch_previous and page > 1:
+            pages.append(page - 1)
+        for target in pages:
+            key = (game_type, provider_id, target)
+            if key in self._pending:
+                continue
+            if len(self._running) >= self.concurrency:
+                metrics.incr("catalog.prefetch.dropped")
+                continue
+            self._pending.add(key)
+            task = asyncio.create_task(self._prefetch(key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _prefetch(self, key: tuple):
+        game_type, provider_id, page = key
+        try:
+            if await self.catalog_cache.warm(self.api_client, game_type, provider_id, page):
+                self.issued += 1
+                metrics.incr("catalog.prefetch.issued")
+                self._remember(key)
+        except Exception as e:
+            logger.warning(f"Prefetch of {key} failed: {e}")
+        finally:
+            self._pending.discard(key)
+
+    def _remember(self, key: tuple):
+        now = time.monotonic()
+        self._prefetched[key] = now
+        if len(self._prefetched) > 5000:
+            horizon = now - self.catalog_cache.ttl
+            self._prefetched = {k: t for k, t in self._prefetched.items() if t > horizon}
@@ -0,0 +1,83 @@
+"""
+Preloaded provider tables per game type
+"""
+import asyncio
+from os import getenv
+from aiogram.types import InlineKeyboardMarkup
+from keyboards.inline import keyboard_games
+from models.model_games import GAME_TYPES, Provider
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+PROVIDER_REFRESH_INTERVAL = int(getenv("PROVIDER_REFRESH_INTERVAL", "600"))
+
+
+class ProviderTable:
+    """Validated providers of one game type with their ready-to-send keyboard"""
+
+    __slots__ = ("game_type", "providers", "markup")
+
+    def __init__(self, game_type: str, providers: list[Provider]):
+        self.game_type = game_type
+        self.providers = providers
+        rows = [(provider.provider_id, f"{provider.provider_name_mobile}") for provider in providers]
+        self.markup: InlineKeyboardMarkup = keyboard_games.provider_list(game_type, rows).as_markup()
+
+
+class ProviderCatalog:
+    """
+    Keeps the provider list of every game type in memory.
+
+    Tables are rebuilt on an interval; a failed refresh keeps the previous table.
+    """
+
+    def __init__(self):
+        self._tables: dict[str, ProviderTable] = {}
+
+    def get(self, game_type: str) -> ProviderTable | None:
+        """Get the preloaded table of a game type"""
+        return self._tables.get(game_type)
+
+    def provider_names(self) -> dict[str, str]:
+        """provider_id -> provider_name across every game type"""
+        return {
+            provider.provider_id: provider.provider_name or ""
+            for table in self._tables.values()
+            for provider in table.providers
+            if provider.provider_id
+        }
+
+    async def get_or_fetch(self, api_client, game_type: str) -> ProviderTable | None:
+        """Get the table of a game type, fetching it when it was never loaded"""
+        table = self._tables.get(game_type)
+        if table is not None:
+            metrics.incr("provider_catalog.hit")
+            return table
+        metrics.incr("provider_catalog.miss")
+        return await self.refresh_type(api_client, game_type)
+
+    async def refresh_type(self, api_client, game_type: str) -> ProviderTable | None:
+        """Fetch and rebuild the table of one game type"""
+        response = await api_client.list_providers(game_type)
+        if response.is_error:
+            logger.warning(f"Failed to refresh providers for {game_type}: {response.get_error_message()}")
+            return self._tables.get(game_type)
+        providers = [Provider(**provider) for provider in response.data.get('providers', []) if provider is not None]
+        table = ProviderTable(game_type, providers)
+        self._tables[game_type] = table
+        return table
+
+    async def refresh(self, api_client):
+        """Refresh the tables of every game type"""
+        results = await asyncio.gather(*(self.refresh_type(api_client, game_type) for game_type in GAME_TYPES), return_exceptions=True)
+        for game_type, result in zip(GAME_TYPES, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to build provider table for {game_type}: {result}")
+
+    async def run(self, api_client, interval: int = PROVIDER_REFRESH_INTERVAL):
+        """Refresh the tables every interval, the first load is done by the caller"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh(api_client)
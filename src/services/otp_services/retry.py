@@ -0,0 +1,69 @@
+"""
+Retry policies for OTP API requests
+"""
+import asyncio
+import random
+import aiohttp
+
+
+class RetryPolicy:
+    """
+    Bounded retry with exponential backoff and full jitter.
+
+    A request is retried while the attempt count, the total deadline and the
+    retryable statuses/exceptions allow it.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        deadline: float = 8.0,
+        retry_statuses: frozenset[int] = frozenset({412}),
+        retry_exceptions: tuple[type[BaseException], ...] = (),
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_statuses = retry_statuses
+        self.retry_exceptions = retry_exceptions
+
+    def backoff(self, attempt: int) -> float:
+        """Get the jittered delay before the next attempt (attempt starts at 1)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def is_retryable_status(self, status: int) -> bool:
+        return status in self.retry_statuses
+
+    def is_retryable_exception(self, error: BaseException) -> bool:
+        return bool(self.retry_exceptions) and isinstance(error, self.retry_exceptions)
+
+    def next_delay(self, attempt: int, elapsed: float) -> float | None:
+        """Get the delay before retrying, or None when the retry budget is exhausted"""
+        if attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if elapsed + delay > self.deadline:
+            return None
+        return delay
+
+
+TRANSIENT_EXCEPTIONS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+# Mutations are only retried when the backend explicitly asked for it
+MUTATION_RETRY_POLICY = RetryPolicy(
+    max_attempts=3,
+    retry_statuses=frozenset({412}),
+)
+
+# Idempotent reads also survive short network hiccups and gateway errors
+READ_RETRY_POLICY = RetryPolicy(
+    max_attempts=4,
+    retry_statuses=frozenset({412, 502, 503, 504}),
+    retry_exceptions=TRANSIENT_EXCEPTIONS,
+)
+
+NO_RETRY_POLICY = RetryPolicy(max_attempts=1)
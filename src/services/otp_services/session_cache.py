@@ -0,0 +1,56 @@
+"""
+Short-lived cache of validated OTP sessions
+"""
+import time
+from os import getenv
+import utils.metrics as metrics
+
+SESSION_CACHE_TTL = float(getenv("OTP_SESSION_CACHE_TTL", "20"))
+
+
+class SessionCache:
+    """
+    Remembers the last successful `me()` payload per Telegram user for a few seconds,
+    so consecutive taps do not each cost a session validation round trip.
+    """
+
+    def __init__(self, ttl: float = SESSION_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: dict[tuple[str, int], tuple[float, dict]] = {}
+
+    def get(self, base_url: str, user_id: int) -> dict | None:
+        """Get a copy of the cached `me()` data, or None when missing or expired"""
+        if self.ttl <= 0:
+            return None
+        entry = self._entries.get((base_url, user_id))
+        if entry is None:
+            metrics.incr("session_cache.miss")
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._entries[(base_url, user_id)]
+            metrics.incr("session_cache.miss")
+            return None
+        metrics.incr("session_cache.hit")
+        return dict(data)
+
+    def set(self, base_url: str, user_id: int, data: dict):
+        """Cache a successful `me()` payload"""
+        if self.ttl <= 0:
+            return
+        self._entries[(base_url, user_id)] = (time.monotonic() + self.ttl, dict(data))
+        if len(self._entries) > 10000:
+            self._evict_expired()
+
+    def invalidate(self, base_url: str, user_id: int):
+        """Forget the cached session of a user"""
+        if self._entries.pop((base_url, user_id), None) is not None:
+            metrics.incr("session_cache.invalidated")
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
+
+
+session_cache = SessionCache()
@@ -0,0 +1,42 @@
+"""
+Request coalescing for identical in-flight calls
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+import utils.metrics as metrics
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    Callers that arrive while a call for the same key is in flight wait for
+    that call and receive its result instead of starting their own.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self.coalesced = 0
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or join the call already in flight for key"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+            metrics.incr(f"{self.name}.coalesced")
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        # Shield so a cancelled caller does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of calls currently in flight"""
+        return len(self._calls)
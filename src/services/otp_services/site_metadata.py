@@ -0,0 +1,85 @@
+"""
+Cached site metadata (server info and social media links)
+"""
+import asyncio
+import time
+from os import getenv
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+SITE_METADATA_REFRESH_INTERVAL = int(getenv("SITE_METADATA_REFRESH_INTERVAL", "300"))
+# Minimum seconds between refreshes triggered by users while nothing is loaded
+SITE_METADATA_RETRY_INTERVAL = int(getenv("SITE_METADATA_RETRY_INTERVAL", "30"))
+
+
+class SiteMetadata:
+    """
+    Server info and social media links of a site, shared by every user.
+
+    Loaded at startup and refreshed on an interval with the site's service
+    client. When the OTP API is down the last good copy keeps being served.
+    If nothing was ever loaded, users trigger at most one refresh per
+    `retry_interval` seconds.
+    """
+
+    def __init__(self, api_client, retry_interval: int = SITE_METADATA_RETRY_INTERVAL):
+        self.api_client = api_client
+        self.retry_interval = retry_interval
+        self.server_info: dict | None = None
+        self.social_media: list | None = None
+        self.updated_at: float | None = None
+        self._attempted_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    async def refresh(self):
+        """Fetch both payloads, keeping the previous copy of any that fails"""
+        self._attempted_at = time.monotonic()
+        server_info, social_media = await asyncio.gather(
+            self.api_client.get_server_info(),
+            self.api_client.get_social_media(),
+        )
+        if server_info.success:
+            self.server_info = server_info.data
+        else:
+            metrics.incr("site_metadata.refresh_failed")
+            logger.warning(f"Failed to refresh server info: {server_info.get_error_message()}")
+        if social_media.success:
+            self.social_media = social_media.data
+        else:
+            metrics.incr("site_metadata.refresh_failed")
+            logger.warning(f"Failed to refresh social media: {social_media.get_error_message()}")
+        if server_info.success or social_media.success:
+            self.updated_at = time.time()
+
+    async def _refresh_missing(self):
+        """Refresh after a failed load, once per retry interval however many users ask"""
+        async with self._refresh_lock:
+            if time.monotonic() - self._attempted_at < self.retry_interval:
+                metrics.incr("site_metadata.retry_skipped")
+                return
+            await self.refresh()
+
+    async def get_server_info(self) -> dict | None:
+        """Get server info, fetching it only if it was never loaded"""
+        if self.server_info is None:
+            await self._refresh_missing()
+        return self.server_info
+
+    async def get_social_media(self) -> list | None:
+        """Get social media links, fetching them only if they were never loaded"""
+        if self.social_media is None:
+            await self._refresh_missing()
+        return self.social_media
+
+    async def run(self, interval: int = SITE_METADATA_REFRESH_INTERVAL):
+        """Refresh every interval, the first load is done by the caller"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Site metadata refresh crashed: {e}")
@@ -0,0 +1,210 @@
+"""
+Redis Streams transport between the update ingress and worker processes
+"""
+import asyncio
+import json
+from os import getenv
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Many more shards than workers, so shards can be spread evenly as workers are added
+UPDATE_STREAM_SHARDS = int(getenv("UPDATE_STREAM_SHARDS", "256"))
+UPDATE_STREAM_MAXLEN = int(getenv("UPDATE_STREAM_MAXLEN", "100000"))
+UPDATE_STREAM_BATCH = int(getenv("UPDATE_STREAM_BATCH", "50"))
+UPDATE_STREAM_INFLIGHT = int(getenv("UPDATE_STREAM_INFLIGHT", "100"))
+# Entries pending this long (ms) on any consumer are taken over, e.g. from a worker that is gone
+UPDATE_STREAM_CLAIM_IDLE = int(getenv("UPDATE_STREAM_CLAIM_IDLE", "60000"))
+UPDATE_STREAM_CLAIM_INTERVAL = float(getenv("UPDATE_STREAM_CLAIM_INTERVAL", "30"))
+UPDATE_STREAM_GROUP = "workers"
+
+
+class UpdateStream:
+    """
+    One Redis Stream per shard, an update goes to shard `chat_id % shards`.
+
+    Every update of a chat lands on the same stream, and a stream is consumed
+    by a single worker, so each chat is still handled in order. Entries carry
+    the chat id so the worker can tell the chats of a shard apart.
+    """
+
+    def __init__(self, redis: Redis, web_id: str, shards: int = UPDATE_STREAM_SHARDS, maxlen: int = UPDATE_STREAM_MAXLEN):
+        self.redis = redis
+        self.web_id = web_id
+        self.shards = shards
+        self.maxlen = maxlen
+
+    def key(self, shard: int) -> str:
+        return f"{self.web_id}:updates:{shard}"
+
+    def shard_of(self, chat_id: int | None) -> int:
+        return (chat_id or 0) % self.shards
+
+    async def publish(self, update: Update, chat_id: int | None):
+        """Append a raw update to the stream of its chat"""
+        shard = self.shard_of(chat_id)
+        await self.redis.xadd(
+            self.key(shard),
+            {"u": update.model_dump_json(by_alias=True, exclude_none=True), "c": "" if chat_id is None else str(chat_id)},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        metrics.incr("update_stream.published")
+
+    async def ensure_group(self, shard: int):
+        try:
+            await self.redis.xgroup_create(self.key(shard), UPDATE_STREAM_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+class UpdateWorker:
+    """
+    Feeds the updates of the shards owned by this worker to the dispatcher.
+
+    Worker `index` of `count` owns every shard where `shard % count == index`,
+    all of them are read with one XREADGROUP. Updates of different chats are
+    handled concurrently, up to `inflight` at a time, while the updates of one
+    chat run one after another and are acknowledged in order. Updates left
+    pending by a previous run of the same worker are handled first, and entries
+    idle for `claim_idle` ms on any other consumer of the owned shards (a dead
+    worker, or a shard that moved when WORKER_COUNT changed) are claimed at
+    startup and every `claim_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        stream: UpdateStream,
+        dp: Dispatcher,
+        bot: Bot,
+        index: int = 0,
+        count: int = 1,
+        batch: int = UPDATE_STREAM_BATCH,
+        inflight: int = UPDATE_STREAM_INFLIGHT,
+        block_ms: int = 5000,
+        claim_idle: int = UPDATE_STREAM_CLAIM_IDLE,
+        claim_interval: float = UPDATE_STREAM_CLAIM_INTERVAL,
+    ):
+        self.stream = stream
+        self.dp = dp
+        self.bot = bot
+        self.index = index
+        self.count = count
+        self.batch = batch
+        self.block_ms = block_ms
+        self.claim_idle = claim_idle
+        self.claim_interval = claim_interval
+        self.consumer = f"worker-{index}"
+        self._slots = asyncio.Semaphore(inflight)
+        # chat id -> the last scheduled update of the chat
+        self._tails: dict[str | None, asyncio.Task] = {}
+        # (stream key, entry id) of the entries scheduled and not acknowledged yet, never scheduled twice
+        self._entries: set[tuple] = set()
+
+    def shards(self) -> list[int]:
+        return [shard for shard in range(self.stream.shards) if shard % self.count == self.index]
+
+    async def run(self):
+        """Consume every owned shard until cancelled"""
+        shards = self.shards()
+        logger.info(f"Update worker {self.index}/{self.count} consuming {len(shards)} of {self.stream.shards} shards")
+        await asyncio.gather(*(self.stream.ensure_group(shard) for shard in shards))
+        # "0" replays our own unacknowledged entries, ">" waits for new ones
+        last_ids = {self.stream.key(shard): "0" for shard in shards}
+        claimer = asyncio.create_task(self._claim_loop(list(last_ids)))
+        try:
+            while True:
+                try:
+                    response = await self.stream.redis.xreadgroup(
+                        UPDATE_STREAM_GROUP, self.consumer, last_ids, count=self.batch, block=self.block_ms,
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Reading update streams of {self.stream.web_id} failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                for key, entries in response or []:
+                    key = key.decode("utf-8") if isinstance(key, bytes) else key
+                    if last_ids[key] != ">":
+                        # Replaying, continue after the last pending entry seen
+                        last_ids[key] = entries[-1][0] if entries else ">"
+                    for entry_id, fields in entries:
+                        await self._schedule(key, entry_id, fields)
+        finally:
+            claimer.cancel()
+            for task in list(self._tails.values()):
+                task.cancel()
+
+    async def _claim_loop(self, keys: list[str]):
+        while True:
+            for key in keys:
+                try:
+                    await self.claim(key)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Claiming idle entries of {key} failed: {e}")
+            await asyncio.sleep(self.claim_interval)
+
+    async def claim(self, key: str):
+        """Take over the entries of a shard left pending by any consumer for longer than claim_idle"""
+        start_id = "0-0"
+        while True:
+            next_id, entries, *_ = await self.stream.redis.xautoclaim(
+                key, UPDATE_STREAM_GROUP, self.consumer, self.claim_idle, start_id=start_id, count=self.batch,
+            )
+            for entry_id, fields in entries:
+                if (key, entry_id) not in self._entries:
+                    metrics.incr("update_stream.claimed")
+                    await self._schedule(key, entry_id, fields)
+            if next_id in (b"0-0", "0-0"):
+                return
+            start_id = next_id
+
+    async def _schedule(self, key: str, entry_id, fields: dict | None):
+        if (key, entry_id) in self._entries:
+            return
+        await self._slots.acquire()
+        self._entries.add((key, entry_id))
+        chat = (fields.get(b"c") or fields.get("c")) if fields else None
+        previous = self._tails.get(chat)
+        task = asyncio.create_task(self._process(key, entry_id, fields, previous))
+        self._tails[chat] = task
+        task.add_done_callback(lambda done: self._tails.pop(chat) if self._tails.get(chat) is done else None)
+
+    async def _process(self, key: str, entry_id, fields: dict | None, previous: asyncio.Task | None):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await self.handle(fields)
+            await self.stream.redis.xack(key, UPDATE_STREAM_GROUP, entry_id)
+        except Exception as e:
+            # Left pending, replayed on the next start or claimed
+            logger.error(f"Acknowledging streamed update {entry_id} failed: {e}")
+        finally:
+            self._entries.discard((key, entry_id))
+            self._slots.release()
+
+    async def handle(self, fields: dict | None):
+        try:
+            if fields is None:
+                # A pending entry trimmed from the stream by MAXLEN, only its id is left
+                metrics.incr("update_stream.trimmed")
+                logger.warning("Skipping a streamed update that was trimmed before it was handled")
+                return
+            raw = fields.get(b"u") or fields.get("u")
+            with metrics.timer("update_stream.handle"):
+                await self.dp.feed_raw_update(self.bot, json.loads(raw))
+            metrics.incr("update_stream.handled")
+        except Exception as e:
+            # Acknowledged anyway, replaying a failing update would block the chat forever
+            metrics.incr("update_stream.failed")
+            logger.error(f"Handling streamed update failed: {e}")
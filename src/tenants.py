@@ -0,0 +1,85 @@
+"""
+Registry of the sites (tenants) served by this process
+"""
+import json
+from os import getenv
+from typing import Any, Iterator
+from aiogram import Bot
+
+from bot_instance import bot as bot_proxy, create_bot
+from config import BotConfig
+
+# JSON list of {"web_id", "bot_token", "site_name", "otp_host", "whitelist_mode", "whitelist_ids", "webhook_secret"}
+TENANTS_FILE = getenv("TENANTS_FILE")
+
+
+class Tenant:
+    """One site: its config, its bot and the services injected into its handlers"""
+
+    def __init__(self, config: BotConfig, bot: Bot, webhook_secret: str | None = None) -> None:
+        self.config = config
+        self.bot = bot
+        self.webhook_secret = webhook_secret
+        self.services: dict[str, Any] = {}
+
+    @property
+    def web_id(self) -> str:
+        return self.config.web_id
+
+
+class TenantRegistry:
+    """Finds the tenant of an update by its bot, or of a request by its web id"""
+
+    def __init__(self) -> None:
+        self._by_bot_id: dict[int, Tenant] = {}
+        self._by_web_id: dict[str, Tenant] = {}
+
+    def add(self, tenant: Tenant):
+        if tenant.web_id in self._by_web_id:
+            raise ValueError(f"Duplicate tenant web_id {tenant.web_id}")
+        self._by_bot_id[tenant.bot.id] = tenant
+        self._by_web_id[tenant.web_id] = tenant
+        if len(self._by_web_id) == 1:
+            # Calls made outside of an update, e.g. at startup, go to the first bot
+            bot_proxy.set_default(tenant.bot)
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(self._by_web_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_web_id)
+
+    def get(self, bot_id: int) -> Tenant | None:
+        return self._by_bot_id.get(bot_id)
+
+    def by_web_id(self, web_id: str) -> Tenant | None:
+        return self._by_web_id.get(web_id)
+
+    def web_id_for(self, bot_id: int) -> str:
+        tenant = self._by_bot_id.get(bot_id)
+        return tenant.web_id if tenant else str(bot_id)
+
+    @classmethod
+    def load(cls, default: BotConfig, bot_token: str | None, webhook_secret: str | None = None) -> "TenantRegistry":
+        """
+        Load tenants from TENANTS_FILE, or the single tenant configured in env.
+
+        Fields missing from a tenant entry fall back to `default`.
+        """
+        registry = cls()
+        if not TENANTS_FILE:
+            registry.add(Tenant(default, create_bot(str(bot_token)), webhook_secret))
+            return registry
+
+        with open(TENANTS_FILE, encoding="utf-8") as file:
+            entries = json.load(file)
+        for entry in entries:
+            config = BotConfig(
+                web_id=entry["web_id"],
+                site_name=entry.get("site_name", entry["web_id"]),
+                whitelist_mode=entry.get("whitelist_mode", default.whitelist_mode),
+                whitelist_ids=entry.get("whitelist_ids", default.whitelist_ids),
+                otp_host=entry.get("otp_host", default.otp_host),
+            )
+            registry.add(Tenant(config, create_bot(entry["bot_token"]), entry.get("webhook_secret", webhook_secret)))
+        return registry
@@ -0,0 +1,162 @@
+"""
+Short callback_data tokens mapped to structured payloads
+"""
+import base64
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import ClassVar, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from redis.asyncio import Redis
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Buttons stay in the chat for a while, tokens should outlive them
+CALLBACK_TOKEN_TTL = int(getenv("CALLBACK_TOKEN_TTL", "604800"))
+CALLBACK_TOKEN_LRU_SIZE = int(getenv("CALLBACK_TOKEN_LRU_SIZE", "10000"))
+
+
+class CallbackPayload(BaseModel):
+    """Base of every payload referenced from callback_data"""
+    kind: ClassVar[str] = "payload"
+
+
+class GameLaunchPayload(CallbackPayload):
+    kind: ClassVar[str] = "game_launch"
+    game_code: str | None = None
+    provider_id: str | None = None
+
+
+class GameSearchPayload(CallbackPayload):
+    kind: ClassVar[str] = "game_search"
+    query: str
+
+
+PayloadT = TypeVar("PayloadT", bound=CallbackPayload)
+
+_TOKEN_RE = re.compile(r"[0-9a-f]{16}")
+
+
+class CallbackTokenRegistry:
+    """
+    Issues 16 character tokens for callback payloads.
+
+    Tokens are a hash of the payload, so the same game or query always gets the
+    same token and repeated renders do not grow Redis. Payloads are kept in
+    Redis with a TTL and in a per-process LRU for the hot ones.
+    """
+
+    def __init__(self, redis: Redis | None, web_id: str, ttl: int = CALLBACK_TOKEN_TTL, lru_size: int = CALLBACK_TOKEN_LRU_SIZE):
+        self.redis = redis
+        self.web_id = web_id
+        self.ttl = ttl
+        self.lru_size = lru_size
+        # token -> (written_at, kind, payload data)
+        self._lru: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+
+    def _key(self, token: str) -> str:
+        return f"{self.web_id}:cbt:{token}"
+
+    @staticmethod
+    def _encode(payload: CallbackPayload) -> tuple[str, str, dict]:
+        data = payload.model_dump(mode="json")
+        raw = json.dumps({"k": payload.kind, "d": data}, sort_keys=True, separators=(",", ":"))
+        token = hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+        return token, raw, data
+
+    def _remember(self, token: str, written_at: float, kind: str, data: dict):
+        self._lru[token] = (written_at, kind, data)
+        self._lru.move_to_end(token)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def issue(self, payload: CallbackPayload) -> str:
+        """Get the token of a payload, storing the payload if needed"""
+        return (await self.issue_many([payload]))[0]
+
+    async def issue_many(self, payloads: list[CallbackPayload]) -> list[str]:
+        """Get the tokens of several payloads with a single Redis round trip"""
+        now = time.time()
+        tokens = []
+        pending: dict[str, tuple[str, str, dict]] = {}
+        for payload in payloads:
+            token, raw, data = self._encode(payload)
+            tokens.append(token)
+            cached = self._lru.get(token)
+            # Rewrite once in a while so the Redis copy never expires before the LRU one
+            if cached is None or now - cached[0] > self.ttl / 2:
+                pending[token] = (raw, payload.kind, data)
+            else:
+                self._lru.move_to_end(token)
+        written_at = now
+        if pending and self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for token, (raw, _, _) in pending.items():
+                        pipe.set(self._key(token), raw, ex=self.ttl)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Callback token write failed: {e}")
+                # Still resolvable in this process, but written again on the next issue
+                written_at = 0.0
+        for token, (_, kind, data) in pending.items():
+            self._remember(token, written_at, kind, data)
+        metrics.incr("callback_token.issued", len(pending))
+        return tokens
+
+    async def resolve(self, token: str, payload_class: Type[PayloadT]) -> PayloadT | None:
+        """Get the payload of a token, None when unknown, expired or of another kind"""
+        cached = self._lru.get(token)
+        if cached is not None:
+            self._lru.move_to_end(token)
+            _, kind, data = cached
+            metrics.incr("callback_token.lru_hit")
+        else:
+            if self.redis is None:
+                return None
+            try:
+                # Refresh the TTL so the Redis copy lives as long as the LRU one assumes
+                raw = await self.redis.getex(self._key(token), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Callback token read failed for {token}: {e}")
+                return None
+            if raw is None:
+                metrics.incr("callback_token.miss")
+                return None
+            entry = json.loads(raw)
+            kind, data = entry["k"], entry["d"]
+            self._remember(token, time.time(), kind, data)
+            metrics.incr("callback_token.redis_hit")
+
+        if kind != payload_class.kind:
+            return None
+        try:
+            return payload_class.model_validate(data)
+        except ValidationError:
+            return None
+
+
+def decode_legacy_game_launch(value: str) -> GameLaunchPayload | None:
+    """Read the base64 `game_code|provider_id` of buttons sent before tokens existed"""
+    if _TOKEN_RE.fullmatch(value):
+        return None
+    try:
+        game_code, provider_id = base64.b64decode(value).decode().split("|")
+    except Exception:
+        return None
+    return GameLaunchPayload(game_code=game_code, provider_id=provider_id)
+
+
+def decode_legacy_game_search(value: str) -> GameSearchPayload | None:
+    """Read the base64 query of search buttons sent before tokens existed"""
+    if _TOKEN_RE.fullmatch(value):
+        return None
+    try:
+        return GameSearchPayload(query=base64.b64decode(value).decode("utf-8"))
+    except Exception:
+        return None
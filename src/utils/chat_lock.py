@@ -0,0 +1,91 @@
+"""
+Per-chat event isolation, so the updates of one chat are handled in order
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from os import getenv
+from typing import AsyncGenerator
+from aiogram.fsm.storage.base import BaseEventIsolation, KeyBuilder, StorageKey
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# off: no ordering, local: one queue per chat in this process, redis: also hold a Redis lock across processes
+CHAT_SERIAL_MODE = getenv("CHAT_SERIAL_MODE", "local").lower()
+UPDATE_CONCURRENCY = int(getenv("UPDATE_CONCURRENCY", "100"))
+CHAT_LOCK_TIMEOUT = float(getenv("CHAT_LOCK_TIMEOUT", "60"))
+CHAT_LOCK_WAIT = float(getenv("CHAT_LOCK_WAIT", "30"))
+
+
+class ChatEventIsolation(BaseEventIsolation):
+    """
+    Runs the updates of one chat one after another, different chats in parallel.
+
+    Used as the dispatcher's events isolation, the FSM middleware takes the lock
+    before it loads the state, so a handler always sees the state left by the
+    previous update of the chat. Waiters of a chat queue on an asyncio.Lock
+    (FIFO), which is dropped again once nobody holds or waits for it. With a
+    Redis client the chat is also locked in Redis so other processes wait too.
+    At most `concurrency` updates run handlers at the same time, a chat only
+    takes a slot once it holds its lock.
+    """
+
+    def __init__(self, redis: Redis | None = None, key_builder: KeyBuilder | None = None, concurrency: int = UPDATE_CONCURRENCY):
+        self.redis = redis
+        self.key_builder = key_builder
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # (bot_id, chat_id) -> [lock, holders and waiters]
+        self._locks: dict[tuple[int, int], list] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        # The whole chat, whichever user or topic the FSM key is for
+        chat = (key.bot_id, key.chat_id)
+        entry = self._locks.setdefault(chat, [asyncio.Lock(), 0])
+        entry[1] += 1
+        started = time.monotonic()
+        try:
+            if entry[0].locked():
+                metrics.incr("chat_lock.contended")
+            async with entry[0]:
+                redis_lock = await self._acquire_redis_lock(key)
+                metrics.observe("chat_lock.wait", time.monotonic() - started)
+                try:
+                    async with self._semaphore:
+                        yield
+                finally:
+                    await self._release_redis_lock(redis_lock)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[chat]
+
+    async def _acquire_redis_lock(self, key: StorageKey):
+        if self.redis is None:
+            return None
+        chat_key = StorageKey(bot_id=key.bot_id, chat_id=key.chat_id, user_id=0)
+        name = self.key_builder.build(chat_key, 'lock') if self.key_builder else f"chat_lock:{key.chat_id}"
+        lock = self.redis.lock(name, timeout=CHAT_LOCK_TIMEOUT, blocking_timeout=CHAT_LOCK_WAIT)
+        if await lock.acquire():
+            return lock
+        # Availability over strict ordering, a stuck holder must not freeze the chat
+        metrics.incr("chat_lock.redis_timeout")
+        logger.warning(f"Chat {key.chat_id} still locked after {CHAT_LOCK_WAIT}s, handling the update anyway")
+        return None
+
+    async def _release_redis_lock(self, lock):
+        if lock is None:
+            return
+        try:
+            await lock.release()
+        except LockError:
+            # Expired while the handler was running
+            metrics.incr("chat_lock.expired")
+
+    async def close(self) -> None:
+        pass
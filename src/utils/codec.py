@@ -0,0 +1,223 @@
+"""
+Serialization codecs for FSM storage values
+"""
+import json
+import zlib
+from abc import ABC, abstractmethod
+from os import getenv
+from typing import Any
+import utils.metrics as metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FSM_CODEC = getenv("FSM_CODEC", "orjson")
+FSM_COMPRESSION = getenv("FSM_COMPRESSION", "zlib")
+FSM_COMPRESS_THRESHOLD = int(getenv("FSM_COMPRESS_THRESHOLD", "1024"))
+FSM_COMPRESS_LEVEL = int(getenv("FSM_COMPRESS_LEVEL", "3"))
+
+# Encoded values start with MAGIC, the format version, the codec id and,
+# since version 2, a compression flags byte.
+# 0xC1 is never used by msgpack and can not start a UTF-8 (JSON) document,
+# so values written before codecs existed are still told apart.
+MAGIC = 0xC1
+FORMAT_VERSION = 2
+
+
+class JsonBytes(bytes):
+    """A value already serialized to JSON, e.g. by pydantic, codecs take it as is when they can"""
+
+
+class Codec(ABC):
+    """Turns JSON-compatible values into bytes and back"""
+    name: str = "codec"
+    codec_id: int = 0
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        ...
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        ...
+
+    def dumps_json(self, data: JsonBytes) -> bytes:
+        """Encode a value given as JSON bytes"""
+        return self.dumps(json.loads(data))
+
+
+class JsonCodec(Codec):
+    name = "json"
+    codec_id = 1
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+    def dumps_json(self, data: JsonBytes) -> bytes:
+        return data
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+    codec_id = 2
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def dumps_json(self, data: JsonBytes) -> bytes:
+        return data
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    codec_id = 3
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class Compression(ABC):
+    """Compresses encoded payloads, identified by a flag in the value header"""
+    name: str = "compression"
+    flag: int = 0
+
+    def __init__(self, level: int = FSM_COMPRESS_LEVEL):
+        self.level = level
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        ...
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+class ZlibCompression(Compression):
+    name = "zlib"
+    flag = 0x01
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCompression(Compression):
+    name = "zstd"
+    flag = 0x02
+
+    def __init__(self, level: int = FSM_COMPRESS_LEVEL):
+        super().__init__(level)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+def available_codecs() -> dict[str, Codec]:
+    """Codecs usable in this environment by name"""
+    codecs: dict[str, Codec] = {"json": JsonCodec()}
+    if orjson is not None:
+        codecs["orjson"] = OrjsonCodec()
+    if msgpack is not None:
+        codecs["msgpack"] = MsgpackCodec()
+    return codecs
+
+
+_CODECS_BY_ID = {codec.codec_id: codec for codec in available_codecs().values()}
+
+
+def get_codec(name: str = FSM_CODEC) -> Codec:
+    """Get a codec by name, orjson falls back to json when it is not installed"""
+    codecs = available_codecs()
+    if name in codecs:
+        return codecs[name]
+    if name == "orjson":
+        return codecs["json"]
+    raise RuntimeError(f"FSM codec '{name}' is not available, install it or pick one of {sorted(codecs)}")
+
+
+def available_compressions() -> dict[str, Compression]:
+    """Compressions usable in this environment by name"""
+    compressions: dict[str, Compression] = {"zlib": ZlibCompression()}
+    if zstandard is not None:
+        compressions["zstd"] = ZstdCompression()
+    return compressions
+
+
+_COMPRESSIONS_BY_FLAG = {compression.flag: compression for compression in available_compressions().values()}
+
+
+def get_compression(name: str = FSM_COMPRESSION) -> Compression | None:
+    """Get a compression by name, None when disabled"""
+    if name in ("", "none"):
+        return None
+    compressions = available_compressions()
+    if name in compressions:
+        return compressions[name]
+    raise RuntimeError(f"FSM compression '{name}' is not available, install it or pick one of {sorted(compressions)}")
+
+
+def encode(value: Any, codec: Codec, compression: Compression | None = None, threshold: int = FSM_COMPRESS_THRESHOLD) -> bytes:
+    """Encode a value with the format marker of codec, compressing it above threshold bytes"""
+    payload = codec.dumps_json(value) if isinstance(value, JsonBytes) else codec.dumps(value)
+    flags = 0
+    if compression is not None and len(payload) >= threshold:
+        compressed = compression.compress(payload)
+        # Small or random payloads can grow, keep whichever is shorter
+        if len(compressed) < len(payload):
+            payload = compressed
+            flags = compression.flag
+            metrics.incr("codec.compressed")
+    return bytes((MAGIC, FORMAT_VERSION, codec.codec_id, flags)) + payload
+
+
+def decode(data: bytes | str) -> Any:
+    """Decode a value written by encode, or a plain JSON value written before codecs"""
+    if isinstance(data, str):
+        return json.loads(data)
+    if not data or data[0] != MAGIC:
+        return json.loads(data)
+    version, codec_id = data[1], data[2]
+    if version == 1:
+        flags, payload = 0, data[3:]
+    elif version == 2:
+        flags, payload = data[3], data[4:]
+    else:
+        raise ValueError(f"Unsupported FSM value format version {version}")
+    codec = _CODECS_BY_ID.get(codec_id)
+    if codec is None:
+        raise ValueError(f"FSM value written with codec {codec_id}, which is not installed")
+    if flags:
+        compression = _COMPRESSIONS_BY_FLAG.get(flags)
+        if compression is None:
+            raise ValueError(f"FSM value compressed with flag {flags}, which is not installed")
+        payload = compression.decompress(payload)
+    return codec.loads(payload)
@@ -0,0 +1,135 @@
+"""
+Background queue for deleting chat messages
+"""
+import asyncio
+import random
+import time
+from os import getenv
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from bot_instance import bot as default_bot
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Bot API accepts at most 100 ids per deleteMessages call
+DELETE_CHUNK_SIZE = 100
+DELETION_RATE = float(getenv("DELETION_RATE", "10"))
+DELETION_MAX_ATTEMPTS = int(getenv("DELETION_MAX_ATTEMPTS", "3"))
+
+
+class DeletionQueue:
+    """
+    Deletes messages off the request path.
+
+    Ids queued for the same bot and chat are merged, sent in chunks of 100 at
+    no more than `rate` calls per second, retried after flood waits and
+    transient errors, and dropped when Telegram refuses them.
+    """
+
+    def __init__(self, rate: float = DELETION_RATE, max_attempts: int = DELETION_MAX_ATTEMPTS):
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self._pending: dict[tuple[Bot, int], set[int]] = {}
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._closing = False
+        self._next_call_at = 0.0
+
+    def enqueue(self, chat_id: int | None, message_ids: list[int] | None, bot: Bot | None = None):
+        """Queue messages for deletion, returns immediately. Defaults to the bot of the current update"""
+        if chat_id is None or not message_ids:
+            return
+        if bot is None:
+            # Resolved now, the worker runs outside of the update and its tenant
+            bot = default_bot.resolve()
+        self._pending.setdefault((bot, chat_id), set()).update(message_ids)
+        metrics.incr("deletion.enqueued", len(message_ids))
+        self._wakeup.set()
+        if self._worker is None or self._worker.done():
+            self.start()
+
+    def pending(self) -> int:
+        """Number of message ids waiting to be deleted"""
+        return sum(len(message_ids) for message_ids in self._pending.values())
+
+    def start(self) -> asyncio.Task:
+        """Start the worker on the running loop"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self.run())
+        return self._worker
+
+    async def run(self):
+        """Process the queue until closed"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.drain()
+            if self._closing:
+                return
+
+    async def drain(self):
+        """Delete everything queued so far"""
+        while self._pending:
+            (bot, chat_id), message_ids = next(iter(self._pending.items()))
+            del self._pending[(bot, chat_id)]
+            ordered = sorted(message_ids)
+            for start in range(0, len(ordered), DELETE_CHUNK_SIZE):
+                try:
+                    await self._delete(bot, chat_id, ordered[start:start + DELETE_CHUNK_SIZE])
+                except asyncio.CancelledError:
+                    # Put back what was not deleted yet, the batch is not lost with the worker
+                    self._pending.setdefault((bot, chat_id), set()).update(ordered[start:])
+                    raise
+
+    async def close(self, timeout: float = 5.0):
+        """Let the worker delete what is still queued, then stop it"""
+        self._closing = True
+        self._wakeup.set()
+        try:
+            # Cancelled on timeout, the batch in progress goes back to the queue
+            await asyncio.wait_for(self._worker if self._worker is not None else self.drain(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._worker = None
+        if self._pending:
+            logger.warning(f"Deletion queue closed with {self.pending()} messages left")
+
+    async def _throttle(self):
+        now = time.monotonic()
+        if self._next_call_at > now:
+            await asyncio.sleep(self._next_call_at - now)
+        self._next_call_at = max(now, self._next_call_at) + 1 / self.rate
+
+    async def _delete(self, bot: Bot, chat_id: int, message_ids: list[int]):
+        attempt = 0
+        while attempt < self.max_attempts:
+            await self._throttle()
+            try:
+                with metrics.timer("deletion.call"):
+                    await bot.delete_messages(chat_id, message_ids)
+                metrics.incr("deletion.deleted", len(message_ids))
+                return
+            except TelegramRetryAfter as e:
+                # A flood wait is not a failed attempt, the call is just late
+                metrics.incr("deletion.retry_after")
+                await asyncio.sleep(e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                metrics.incr("deletion.retry")
+                logger.warning(f"Deleting {len(message_ids)} messages in chat {chat_id} failed, attempt {attempt}: {e}")
+                await asyncio.sleep(random.uniform(0, min(10, 2 ** attempt)))
+            except TelegramBadRequest as e:
+                # Already deleted, too old or not ours, retrying will not help
+                metrics.incr("deletion.rejected", len(message_ids))
+                logger.debug("Telegram refused to delete messages in chat %s: %s", chat_id, e)
+                return
+            except Exception as e:
+                metrics.incr("deletion.failed", len(message_ids))
+                logger.error(f"Error deleting messages in chat {chat_id}: {e}")
+                return
+        metrics.incr("deletion.failed", len(message_ids))
+
+
+deletion_queue = DeletionQueue()
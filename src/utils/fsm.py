@@ -1,4 +1,5 @@
 from aiogram.fsm.context import FSMContext
+from utils.unit_of_work import discard_pending_writes
 
 async def reset_fsm(state: FSMContext):
      # Get all stored FSM data
@@ -11,6 +12,7 @@ async def reset_fsm(state: FSMContext):
         temp_data[data] = state_data.get(data)
 
     # Reset all state data
+    discard_pending_writes(state)
     await state.clear()
     
     # Restore only the preserved field
@@ -1,71 +1,242 @@
 """
 Logging utility module for the Telegram bot.
-Configures logging with timestamps and file output.
+Records are queued on the event loop thread and written by a background
+listener thread, as JSON lines to a rotating file and as text to stdout.
 """
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from os import getenv, makedirs
 
+LOG_LEVEL = getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FILE_FORMAT = getenv("LOG_FILE_FORMAT", "json").lower()
+LOG_MAX_BYTES = int(getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(getenv("LOG_BACKUP_COUNT", "7"))
+LOG_ROTATE_WHEN = getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_QUEUE_SIZE = int(getenv("LOG_QUEUE_SIZE", "10000"))
+# Records kept per call site and window, e.g. "WARNING:20,ERROR:10", other levels are never sampled
+LOG_SAMPLE_BURST = getenv("LOG_SAMPLE_BURST", "WARNING:20,ERROR:10")
+LOG_SAMPLE_WINDOW = float(getenv("LOG_SAMPLE_WINDOW", "60"))
+
+# Attributes every LogRecord has, anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, fields passed with extra= are included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "logger": record.name,
+            "where": f"{record.module}:{record.lineno}",
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotates at the time interval and also whenever the file reaches max_bytes"""
+
+    def __init__(self, filename, max_bytes: int = 0, **kwargs) -> None:
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0 or self.stream is None:
+            return False
+        self.stream.seek(0, 2)
+        return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        # Several size rollovers in one interval would share the time suffix, each
+        # one takes the next index so the name of a deleted backup is never reused
+        name = super().rotation_filename(default_name)
+        directory, base = os.path.split(name)
+        indexes = [
+            int(file_name[len(base) + 1:])
+            for file_name in os.listdir(directory or ".")
+            if file_name.startswith(base + ".") and file_name[len(base) + 1:].isdigit()
+        ]
+        if not indexes and not os.path.exists(name):
+            return name
+        return f"{name}.{max(indexes, default=0) + 1:03d}"
+
+    def getFilesToDelete(self):
+        # The base class sorts backups by name, keep the newest ones by age instead
+        backup_count, self.backupCount = self.backupCount, 0
+        try:
+            files = super().getFilesToDelete()
+        finally:
+            self.backupCount = backup_count
+        files.sort(key=lambda file_name: (os.path.getmtime(file_name), file_name))
+        return files[:max(0, len(files) - self.backupCount)]
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps the first `burst` records of a call site and level per window.
+
+    The rest are dropped and counted, the next record let through from that
+    call site says how many were suppressed.
+    """
+
+    def __init__(self, bursts: dict[int, int], window: float = LOG_SAMPLE_WINDOW) -> None:
+        super().__init__()
+        self.bursts = bursts
+        self.window = window
+        # (level, path, line) -> [window start, records seen, suppressed]
+        self._sites: dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        burst = self.bursts.get(record.levelno)
+        if burst is None:
+            return True
+        now = time.monotonic()
+        site = self._sites.get((record.levelno, record.pathname, record.lineno))
+        if site is None or now - site[0] >= self.window:
+            suppressed = site[2] if site else 0
+            self._sites[(record.levelno, record.pathname, record.lineno)] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+                record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+            return True
+        site[1] += 1
+        if site[1] <= burst:
+            return True
+        site[2] += 1
+        return False
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Merges the message arguments on the caller thread, formatting is left to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks can not be pickled or rendered later, the frames may be gone
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the event loop on logging, drop instead
+            pass
+
+
+def _parse_bursts(spec: str) -> dict[int, int]:
+    bursts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        level, _, burst = item.partition(":")
+        bursts[logging.getLevelName(level.upper())] = int(burst)
+    return bursts
+
 
 def setup_logger(web_id: str = None, log_dir: str = "logs") -> logging.Logger:
     """
     Setup logger with timestamp and file output.
-    
+
     Args:
         web_id: The web ID to use for log file naming (format: {web_id}.log)
         log_dir: Directory to store log files (default: "logs")
-    
+
     Returns:
         Configured logger instance
     """
+    global _listener
+
     # Get web_id from environment if not provided
     if web_id is None:
         web_id = getenv("WEB_ID", "bot")
-    
+
     # Create log directory if it doesn't exist
     log_path = Path(log_dir)
     log_path.mkdir(exist_ok=True)
-    
+
     # Create log file name
     log_file = log_path / f"{web_id}.log"
-    
+
     # Create logger
     logger = logging.getLogger("bot")
-    logger.setLevel(logging.DEBUG)
-    
+    logger.setLevel(LOG_LEVEL)
+
     # Remove existing handlers to avoid duplicates
     logger.handlers.clear()
-    
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+
     # Create formatter with timestamp
     formatter = logging.Formatter(
         fmt='[%(asctime)s] [%(levelname)s] - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
-    
-    # File handler
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+
+    # File handler, rotated daily and by size
+    file_handler = SizedTimedRotatingFileHandler(
+        log_file,
+        max_bytes=LOG_MAX_BYTES,
+        when=LOG_ROTATE_WHEN,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8',
+    )
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    
+    file_handler.setFormatter(JsonFormatter() if LOG_FILE_FORMAT == "json" else formatter)
+
     # Console handler (optional, for development)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    # Handlers run on the listener thread, the caller only enqueues
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(_parse_bursts(LOG_SAMPLE_BURST)))
+    logger.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+
     return logger
 
 
+@atexit.register
+def _flush_logs():
+    """Write what is still queued before the process exits"""
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+
+
 def get_logger() -> logging.Logger:
     """
     Get the configured logger instance.
     If logger hasn't been setup, creates a default one.
-    
+
     Returns:
         Logger instance
     """
@@ -74,4 +245,3 @@ def get_logger() -> logging.Logger:
         # If logger not initialized, setup with default
         return setup_logger()
     return logger
-
@@ -1,12 +1,4 @@
-from bot_instance import bot
-from utils.logger import get_logger
-
-logger = get_logger()
+from utils.deletion_queue import deletion_queue
 
 async def delete_messages(chat_id: int, messages_ids: list[int]) -> None:  
-    try:
-       await bot.delete_messages(chat_id, messages_ids)
-    except Exception as e:
-        logger.error(f"Error deleting messages: {e}")
-        pass
-    
\ No newline at end of file
+    deletion_queue.enqueue(chat_id, messages_ids)
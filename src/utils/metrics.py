@@ -0,0 +1,74 @@
+"""
+In-process metrics registry.
+Keeps simple counters and timing summaries that can be inspected at runtime.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class TimingSummary:
+    """Running count/total/max of an observed value"""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+_counters: dict[str, int] = defaultdict(int)
+_timings: dict[str, TimingSummary] = defaultdict(TimingSummary)
+
+
+def incr(name: str, value: int = 1) -> None:
+    """Increment a counter"""
+    _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    """Record a single observation (e.g. seconds, bytes)"""
+    _timings[name].observe(value)
+
+
+@contextmanager
+def timer(name: str):
+    """Observe the wall time spent inside the block, in seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def get_counter(name: str) -> int:
+    """Get the current value of a counter"""
+    return _counters.get(name, 0)
+
+
+def snapshot() -> dict:
+    """Get a copy of every counter and timing summary"""
+    return {
+        "counters": dict(_counters),
+        "timings": {
+            name: {"count": t.count, "avg": t.avg, "max": t.max}
+            for name, t in _timings.items()
+        },
+    }
+
+
+def reset() -> None:
+    """Reset every metric"""
+    _counters.clear()
+    _timings.clear()
@@ -1,19 +1,30 @@
 from typing import Type
 from models.base_state_model import BaseStateModel
 from aiogram.fsm.context import FSMContext
+from utils.unit_of_work import current_unit_of_work, get_state_data_with_versions
+from utils.versioned_state import track_loaded
 
 async def load_model(model_class: Type[BaseStateModel], state: FSMContext) -> BaseStateModel | None:
-    # Get FSM data
-    fsm_data = await state.get_data()
-    
-    # Create temporary instance to get state key
-    temp_model = model_class()
-    state_key = temp_model._get_state_key()
+    state_key = model_class._get_state_key()
+
+    # Reuse the instance already loaded or saved during this update
+    uow = current_unit_of_work(state)
+    if uow is not None:
+        known, model_instance = uow.get(state_key)
+        if known:
+            return model_instance
+
+    # Get FSM data, read once per update
+    fsm_data, versions = await get_state_data_with_versions(state)
     
     # Get model data from FSM
     model_data = fsm_data.get(state_key, False)
     if model_data:
-        model_instance = model_class.model_validate_json(model_data)
+        model_instance = model_class.from_state_value(model_data)
         model_instance._state = state
+        # Saves are compare-and-set against the version read here
+        track_loaded(model_instance, model_data, versions.get(state_key, 0))
+        if uow is not None:
+            uow.register(model_instance)
         return model_instance
     return None
\ No newline at end of file
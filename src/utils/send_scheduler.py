@@ -0,0 +1,249 @@
+"""
+Outbound Telegram request scheduling with rate limits and priority lanes
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import getenv
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    CopyMessages,
+    DeleteMessage,
+    DeleteMessages,
+    ForwardMessage,
+    ForwardMessages,
+    Response,
+    SendAnimation,
+    SendAudio,
+    SendContact,
+    SendDice,
+    SendDocument,
+    SendLocation,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendPoll,
+    SendSticker,
+    SendVenue,
+    SendVideo,
+    SendVideoNote,
+    SendVoice,
+    TelegramMethod,
+)
+from aiogram.methods.base import TelegramType
+import utils.metrics as metrics
+from utils.logger import get_logger
+
+logger = get_logger()
+
+SEND_GLOBAL_RATE = float(getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = int(getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRY_AFTER = int(getenv("SEND_MAX_RETRY_AFTER", "3"))
+# Flood waits in this many different chats within the window hold back the whole bot
+SEND_GLOBAL_FLOOD_CHATS = int(getenv("SEND_GLOBAL_FLOOD_CHATS", "3"))
+SEND_GLOBAL_FLOOD_WINDOW = float(getenv("SEND_GLOBAL_FLOOD_WINDOW", "10"))
+
+LANE_INTERACTIVE = 0
+LANE_BULK = 1
+
+# Cleanup traffic never needs to beat a reply to the user
+BULK_METHODS = (DeleteMessage, DeleteMessages)
+# Only new messages count against the per-chat limit, edits, deletes and chat actions do not
+MESSAGE_METHODS = (
+    SendMessage, SendPhoto, SendVideo, SendAnimation, SendAudio, SendDocument, SendVoice, SendVideoNote,
+    SendSticker, SendMediaGroup, SendLocation, SendVenue, SendContact, SendPoll, SendDice,
+    ForwardMessage, ForwardMessages, CopyMessage, CopyMessages,
+)
+
+_lane: ContextVar[int] = ContextVar("send_lane", default=LANE_INTERACTIVE)
+
+
+@contextmanager
+def bulk_lane():
+    """Send every request made inside the block on the bulk lane, e.g. broadcasts"""
+    token = _lane.set(LANE_BULK)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self) -> float:
+        """Take a token, returns 0 on success or the seconds to wait before trying again"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, seconds: float):
+        """Refuse tokens for a while, used after a flood wait"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def idle(self) -> bool:
+        """True when the bucket is full again and can be forgotten"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class PriorityTokenBucket(TokenBucket):
+    """Token bucket where waiters on the interactive lane are always served first"""
+
+    def __init__(self, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self._waiters: tuple[deque, deque] = (deque(), deque())
+        self._pump: asyncio.Task | None = None
+
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters)
+
+    async def acquire(self, lane: int):
+        if not self.waiting() and self.try_take() == 0:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        await future
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        for waiters in self._waiters:
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    return future
+        return None
+
+    async def _run(self):
+        while self.waiting():
+            wait = self.try_take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            future = self._next_waiter()
+            if future is None:
+                # Every waiter gave up, give the token back
+                self.tokens += 1
+                return
+            future.set_result(None)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Request middleware pacing everything the bot sends to a chat.
+
+    New messages wait for a per-chat token, then every request to a chat waits
+    for a global token of its bot. Limits are per bot so tenants sharing a session
+    do not slow each other down. Interactive requests are served before bulk ones
+    (deletes, or anything sent inside `bulk_lane()`). Flood waits block the chat
+    and are retried automatically. The whole bot is only blocked when several
+    chats get flood waits at once, or for requests not paced per chat. Requests
+    without a chat, like getUpdates, are not paced.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: int = SEND_CHAT_BURST,
+        max_retry_after: int = SEND_MAX_RETRY_AFTER,
+        flood_chats: int = SEND_GLOBAL_FLOOD_CHATS,
+        flood_window: float = SEND_GLOBAL_FLOOD_WINDOW,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retry_after = max_retry_after
+        self.flood_chats = flood_chats
+        self.flood_window = flood_window
+        self._global_buckets: dict[int, PriorityTokenBucket] = {}
+        self._chat_buckets: dict[tuple[int, int | str], PriorityTokenBucket] = {}
+        # bot_id -> chat_id -> time of its last flood wait
+        self._floods: dict[int, dict[int | str, float]] = {}
+
+    def _global_bucket(self, bot_id: int) -> PriorityTokenBucket:
+        bucket = self._global_buckets.get(bot_id)
+        if bucket is None:
+            bucket = self._global_buckets[bot_id] = PriorityTokenBucket(self.global_rate, self.global_rate)
+        return bucket
+
+    def _chat_bucket(self, bot_id: int, chat_id: int | str) -> PriorityTokenBucket:
+        key = (bot_id, chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._forget_idle_chats()
+            bucket = self._chat_buckets[key] = PriorityTokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _bot_flooded(self, bot_id: int, chat_id: int | str) -> bool:
+        """Record a flood wait of a chat, True once enough chats of the bot got one recently"""
+        now = time.monotonic()
+        floods = self._floods.setdefault(bot_id, {})
+        floods[chat_id] = now
+        for key in [key for key, at in floods.items() if now - at > self.flood_window]:
+            del floods[key]
+        return len(floods) >= self.flood_chats
+
+    def _forget_idle_chats(self):
+        for key in [key for key, bucket in self._chat_buckets.items() if not bucket.waiting() and bucket.idle()]:
+            del self._chat_buckets[key]
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        lane = LANE_BULK if isinstance(method, BULK_METHODS) else _lane.get()
+        chat_bucket = self._chat_bucket(bot.id, chat_id) if isinstance(method, MESSAGE_METHODS) else None
+        global_bucket = self._global_bucket(bot.id)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            if chat_bucket is not None:
+                await chat_bucket.acquire(lane)
+            await global_bucket.acquire(lane)
+            metrics.observe(f"send.wait.{'bulk' if lane == LANE_BULK else 'interactive'}", time.monotonic() - started)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                metrics.incr("send.retry_after")
+                if chat_bucket is not None:
+                    chat_bucket.block(e.retry_after)
+                # A single chat's limit, e.g. a busy group, must not stall every other chat
+                if chat_bucket is None or self._bot_flooded(bot.id, chat_id):
+                    metrics.incr("send.global_block")
+                    global_bucket.block(e.retry_after)
+                if attempt > self.max_retry_after:
+                    raise
+                logger.warning(f"Flood wait of {e.retry_after}s on {type(method).__name__} in chat {chat_id}, retrying")
@@ -0,0 +1,235 @@
+"""
+FSM storage keeping every data key in its own Redis hash field
+"""
+from typing import Any, Dict, Mapping, Optional
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.storage.base import KeyBuilder, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError, WatchError
+import utils.codec as codec
+from utils.codec import FSM_COMPRESS_THRESHOLD, Codec, Compression, get_codec
+import utils.metrics as metrics
+
+# Hash field holding the version of a data key, bumped on every write of the key
+VERSION_PREFIX = "__v:"
+
+
+class HashRedisStorage(RedisStorage):
+    """
+    RedisStorage where the data of a chat is a hash instead of one JSON string.
+
+    Each top level key (`user`, `menu`, `telegram_data`...) is a hash field, so
+    `update_data` only sends the fields that changed with HSET/HDEL and reads
+    the result back in the same round trip. Setting a key to None removes its
+    field. Chats still stored as a single JSON string are converted to a hash
+    the first time they are touched.
+
+    Field values are encoded with a codec behind a format marker and compressed
+    once they reach `compress_threshold` bytes. Fields written as plain JSON by
+    older versions are still readable.
+
+    Every data key has a version kept in a `__v:<key>` field of the same hash.
+    Writes bump it, also when `set_data` clears the key, and `compare_and_set`
+    only writes when the versions are the ones the caller read.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        key_builder: Optional[KeyBuilder] = None,
+        codec: Codec | None = None,
+        compression: Compression | None = None,
+        compress_threshold: int = FSM_COMPRESS_THRESHOLD,
+        **kwargs: Any,
+    ):
+        super().__init__(redis=redis, key_builder=key_builder, **kwargs)
+        self.codec = codec or get_codec()
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+
+    def _encode(self, data: Mapping[str, Any]) -> tuple[dict[str, bytes], list[str]]:
+        fields = {}
+        removed = []
+        for field, value in data.items():
+            if value is None:
+                removed.append(field)
+            else:
+                fields[field] = codec.encode(value, self.codec, self.compression, self.compress_threshold)
+        return fields, removed
+
+    def _decode(self, raw: dict) -> Dict[str, Any]:
+        data = {}
+        for field, value in raw.items():
+            if isinstance(field, bytes):
+                field = field.decode("utf-8")
+            if field.startswith(VERSION_PREFIX):
+                continue
+            data[field] = codec.decode(value)
+        return data
+
+    @staticmethod
+    def _decode_versions(raw: dict) -> Dict[str, int]:
+        versions = {}
+        for field, value in raw.items():
+            if isinstance(field, bytes):
+                field = field.decode("utf-8")
+            if field.startswith(VERSION_PREFIX):
+                versions[field[len(VERSION_PREFIX):]] = int(value)
+        return versions
+
+    async def _migrate(self, redis_key: str):
+        """Convert a legacy JSON string value into a hash, keeping its TTL"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(redis_key)
+                if await pipe.type(redis_key) not in (b"string", "string"):
+                    return
+                raw = await pipe.get(redis_key)
+                ttl = await pipe.pttl(redis_key)
+                if isinstance(raw, bytes):
+                    raw = raw.decode("utf-8")
+                fields, _ = self._encode(self.json_loads(raw))
+                pipe.multi()
+                pipe.delete(redis_key)
+                if fields:
+                    pipe.hset(redis_key, mapping=fields)
+                    if ttl > 0:
+                        pipe.pexpire(redis_key, ttl)
+                await pipe.execute()
+                metrics.incr("storage.migrated")
+            except WatchError:
+                # Someone else converted or rewrote it in the meantime
+                pass
+
+    async def _run(self, redis_key: str, operation):
+        try:
+            return await operation()
+        except ResponseError:
+            # WRONGTYPE, the chat is still stored as a JSON string
+            if await self.redis.type(redis_key) not in (b"string", "string"):
+                raise
+        await self._migrate(redis_key)
+        return await operation()
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        redis_key = self.key_builder.build(key, "data")
+        fields, _ = self._encode(data)
+
+        async def operation():
+            while True:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    try:
+                        await pipe.watch(redis_key)
+                        existing = [field.decode("utf-8") if isinstance(field, bytes) else field for field in await pipe.hkeys(redis_key)]
+                        # Version fields survive a clear, a model read before it must not match afterwards
+                        stale = [field for field in existing if not field.startswith(VERSION_PREFIX) and field not in fields]
+                        pipe.multi()
+                        if stale:
+                            pipe.hdel(redis_key, *stale)
+                        if fields:
+                            pipe.hset(redis_key, mapping=fields)
+                        for field in [*stale, *fields]:
+                            pipe.hincrby(redis_key, VERSION_PREFIX + field, 1)
+                        if self.data_ttl is not None:
+                            pipe.expire(redis_key, self.data_ttl)
+                        await pipe.execute()
+                        return
+                    except WatchError:
+                        metrics.incr("storage.cas_retry")
+
+        await self._run(redis_key, operation)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        redis_key = self.key_builder.build(key, "data")
+        return self._decode(await self._run(redis_key, lambda: self.redis.hgetall(redis_key)))
+
+    async def get_data_with_versions(self, key: StorageKey) -> tuple[Dict[str, Any], Dict[str, int]]:
+        """Get data and the version of every data key, keys never written have no version"""
+        redis_key = self.key_builder.build(key, "data")
+        raw = await self._run(redis_key, lambda: self.redis.hgetall(redis_key))
+        return self._decode(raw), self._decode_versions(raw)
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Optional[Any] = None) -> Optional[Any]:
+        redis_key = self.key_builder.build(storage_key, "data")
+        value = await self._run(redis_key, lambda: self.redis.hget(redis_key, dict_key))
+        if value is None:
+            return default
+        return codec.decode(value)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        redis_key = self.key_builder.build(key, "data")
+        fields, removed = self._encode(data)
+
+        async def operation():
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if fields:
+                    pipe.hset(redis_key, mapping=fields)
+                if removed:
+                    pipe.hdel(redis_key, *removed)
+                for field in data:
+                    pipe.hincrby(redis_key, VERSION_PREFIX + field, 1)
+                if self.data_ttl is not None:
+                    pipe.expire(redis_key, self.data_ttl)
+                pipe.hgetall(redis_key)
+                return (await pipe.execute())[-1]
+
+        metrics.incr("storage.fields_written", len(fields) + len(removed))
+        return self._decode(await self._run(redis_key, operation))
+
+    async def compare_and_set(
+        self,
+        key: StorageKey,
+        data: Mapping[str, Any],
+        expected: Mapping[str, int | None],
+    ) -> tuple[bool, Dict[str, int], Dict[str, Any]]:
+        """
+        Write data keys only if their versions still match `expected`.
+
+        A key missing from `expected` or expected as None is written
+        unconditionally, a key never written has version 0. Returns
+        (True, new versions, {}) once written, or (False, current versions,
+        current values of the conflicting keys) without writing anything.
+        """
+        redis_key = self.key_builder.build(key, "data")
+        fields, removed = self._encode(data)
+        checked = [field for field in data if expected.get(field) is not None]
+
+        async def operation():
+            while True:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    try:
+                        await pipe.watch(redis_key)
+                        if checked:
+                            raw = await pipe.hmget(redis_key, [VERSION_PREFIX + field for field in checked])
+                            versions = {field: int(value or 0) for field, value in zip(checked, raw)}
+                            conflicts = [field for field in checked if versions[field] != expected[field]]
+                            if conflicts:
+                                values = await pipe.hmget(redis_key, conflicts)
+                                current = {
+                                    field: codec.decode(value) if value is not None else None
+                                    for field, value in zip(conflicts, values)
+                                }
+                                return False, versions, current
+                        pipe.multi()
+                        if fields:
+                            pipe.hset(redis_key, mapping=fields)
+                        if removed:
+                            pipe.hdel(redis_key, *removed)
+                        for field in data:
+                            pipe.hincrby(redis_key, VERSION_PREFIX + field, 1)
+                        if self.data_ttl is not None:
+                            pipe.expire(redis_key, self.data_ttl)
+                        results = await pipe.execute()
+                        offset = bool(fields) + bool(removed)
+                        return True, dict(zip(data, results[offset:offset + len(data)])), {}
+                    except WatchError:
+                        # Another field of the chat changed, the versions are checked again
+                        metrics.incr("storage.cas_retry")
+
+        metrics.incr("storage.fields_written", len(fields) + len(removed))
+        return await self._run(redis_key, operation)
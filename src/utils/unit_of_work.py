@@ -0,0 +1,157 @@
+"""
+Per-update unit of work for state model writes
+"""
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+from aiogram.fsm.context import FSMContext
+import utils.metrics as metrics
+from utils.logger import get_logger
+from utils.versioned_state import read_state, write_models
+
+if TYPE_CHECKING:
+    from models.base_state_model import BaseStateModel
+
+logger = get_logger()
+
+_current: ContextVar["UnitOfWork | None"] = ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """
+    Collects state model writes made while handling one update.
+
+    Models loaded or saved during the update are kept in an identity map, so
+    every load of the same key returns the same instance. Saves only mark the
+    model dirty and everything is written with a single `update_data` when the
+    update is done. Once flushed the unit of work is closed and late writes go
+    straight to the storage again.
+
+    FSM data is read once per update and shared by every loader as a snapshot,
+    together with the versions the models are later written against.
+    """
+
+    def __init__(self, state: FSMContext):
+        self.state = state
+        self.closed = False
+        self._snapshot: dict[str, Any] | None = None
+        self.versions: dict[str, int] = {}
+        self._models: dict[str, "BaseStateModel"] = {}
+        self._dirty: dict[str, "BaseStateModel | None"] = {}
+
+    def owns(self, state: FSMContext | None) -> bool:
+        """True when writes to state can be deferred to this unit of work"""
+        return (
+            not self.closed
+            and state is not None
+            and state.storage is self.state.storage
+            and state.key == self.state.key
+        )
+
+    async def get_data(self) -> dict[str, Any]:
+        """FSM data as read at the first call of this update, must not be mutated"""
+        if self._snapshot is None:
+            self._snapshot, self.versions = await read_state(self.state)
+            metrics.incr("uow.snapshot_read")
+        else:
+            metrics.incr("uow.snapshot_hit")
+        return self._snapshot
+
+    def invalidate_snapshot(self):
+        """Read FSM data again on next access, call after writing the state directly"""
+        self._snapshot = None
+        self.versions = {}
+
+    def get(self, key: str) -> tuple[bool, "BaseStateModel | None"]:
+        """Get (known, model) for a state key, model is None when it was deleted"""
+        if key in self._dirty:
+            return True, self._dirty[key]
+        if key in self._models:
+            return True, self._models[key]
+        return False, None
+
+    def register(self, model: "BaseStateModel"):
+        """Remember a model loaded from the storage"""
+        self._models[model._get_state_key()] = model
+
+    def mark_dirty(self, model: "BaseStateModel"):
+        """Schedule a model to be written at flush"""
+        key = model._get_state_key()
+        self._models[key] = model
+        self._dirty[key] = model
+        metrics.incr("uow.mark_dirty")
+
+    def mark_deleted(self, key: str):
+        """Schedule a state key to be removed at flush"""
+        self._models.pop(key, None)
+        self._dirty[key] = None
+
+    def discard(self):
+        """Drop every pending write, used when the state is cleared directly"""
+        self._models.clear()
+        self._dirty.clear()
+        self._snapshot = None
+        self.versions = {}
+
+    async def flush(self):
+        """Write every dirty model at once and close the unit of work"""
+        self.closed = True
+        if not self._dirty:
+            return
+        payload = dict(self._dirty)
+        self._dirty.clear()
+        metrics.incr("uow.flush")
+        metrics.observe("uow.flush_models", len(payload))
+        await write_models(self.state, payload)
+
+
+def current_unit_of_work(state: FSMContext | None = None) -> UnitOfWork | None:
+    """Get the open unit of work of the current update, if it owns state"""
+    uow = _current.get()
+    if uow is None or not uow.owns(state if state is not None else uow.state):
+        return None
+    return uow
+
+
+async def get_state_data(state: FSMContext) -> dict[str, Any]:
+    """Get FSM data from the update snapshot when possible"""
+    uow = current_unit_of_work(state)
+    if uow is None:
+        return await state.get_data()
+    return await uow.get_data()
+
+
+async def get_state_data_with_versions(state: FSMContext) -> tuple[dict[str, Any], dict[str, int]]:
+    """Get FSM data and key versions from the update snapshot when possible"""
+    uow = current_unit_of_work(state)
+    if uow is None:
+        return await read_state(state)
+    return await uow.get_data(), uow.versions
+
+
+def invalidate_state_data(state: FSMContext):
+    """Drop the update snapshot of state after writing it directly"""
+    uow = current_unit_of_work(state)
+    if uow is not None:
+        uow.invalidate_snapshot()
+
+
+def discard_pending_writes(state: FSMContext):
+    """Forget deferred writes of state, call before clearing it directly"""
+    uow = current_unit_of_work(state)
+    if uow is not None:
+        uow.discard()
+
+
+def begin(state: FSMContext):
+    """Open a unit of work for the current context, returns a reset token"""
+    return _current.set(UnitOfWork(state))
+
+
+async def commit(token):
+    """Flush the unit of work opened by begin and restore the previous one"""
+    uow = _current.get()
+    try:
+        if uow is not None:
+            await uow.flush()
+    finally:
+        _current.reset(token)
@@ -0,0 +1,112 @@
+"""
+Versioned reads and compare-and-set writes of state models
+"""
+import json
+from os import getenv
+from typing import TYPE_CHECKING, Any
+from aiogram.fsm.context import FSMContext
+import utils.metrics as metrics
+from utils.codec import JsonBytes
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from models.base_state_model import BaseStateModel
+
+logger = get_logger()
+
+STATE_CAS_RETRIES = int(getenv("STATE_CAS_RETRIES", "3"))
+
+
+async def read_state(state: FSMContext) -> tuple[dict[str, Any], dict[str, int]]:
+    """Get FSM data and the version of every key, versions are empty when the storage has none"""
+    if hasattr(state.storage, "get_data_with_versions"):
+        return await state.storage.get_data_with_versions(state.key)
+    return await state.get_data(), {}
+
+
+def merge_values(base: Any, mine: Any, theirs: Any) -> Any:
+    """
+    Three-way merge of plain state values.
+
+    A side that did not change a value takes the other side's change. When both
+    changed it, dicts are merged key by key and lists keep the additions of both
+    sides minus the items either side removed (e.g. tracked message ids).
+    Anything else keeps our value.
+    """
+    if mine == theirs or theirs == base:
+        return mine
+    if mine == base:
+        return theirs
+    if isinstance(mine, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        keys = list(mine) + [key for key in theirs if key not in mine]
+        return {key: merge_values(base.get(key), mine.get(key), theirs.get(key)) for key in keys}
+    if isinstance(mine, list) and isinstance(theirs, list):
+        base = base if isinstance(base, list) else []
+        kept = [item for item in theirs if item in mine or item not in base]
+        return kept + [item for item in mine if item not in theirs and item not in base]
+    return mine
+
+
+def track_loaded(model: "BaseStateModel", value: Any, version: int | None):
+    """Remember what a model was read as, the base of later merges"""
+    model._version = version
+    model._base = value if isinstance(value, (dict, JsonBytes)) else model.to_state_value()
+
+
+def _plain(value: Any) -> Any:
+    # Written values stay JSON bytes until a merge needs them
+    return json.loads(value) if isinstance(value, JsonBytes) else value
+
+
+def _rebase(model: "BaseStateModel", mine: Any, theirs: Any, version: int):
+    if not isinstance(theirs, dict):
+        theirs = type(model).from_state_value(theirs).to_state_value()
+    merged = type(model).from_state_value(merge_values(_plain(getattr(model, "_base", None)), _plain(mine), theirs))
+    # In place, handlers may still hold the instance, its state and save task are kept
+    for name in type(model).model_fields:
+        model.__dict__[name] = merged.__dict__[name]
+    track_loaded(model, theirs, version)
+
+
+async def write_models(state: FSMContext, models: dict[str, "BaseStateModel | None"]):
+    """
+    Write state models with compare-and-set on the versions they were read at.
+
+    On a conflict our changes are merged onto the current copy and the write is
+    retried. A model deleted in the meantime is not written back. Models without
+    a version, and storages without versions, are written as before.
+    """
+    storage = state.storage
+    if not hasattr(storage, "compare_and_set"):
+        await state.update_data(**{key: model.to_state_value() if model is not None else None for key, model in models.items()})
+        return
+
+    pending = dict(models)
+    for attempt in range(STATE_CAS_RETRIES + 1):
+        values = {key: model.to_state_json() if model is not None else None for key, model in pending.items()}
+        expected = {}
+        if attempt < STATE_CAS_RETRIES:
+            expected = {key: getattr(model, "_version", None) for key, model in pending.items() if model is not None}
+        elif attempt:
+            logger.warning(f"State of chat {state.key.chat_id} still conflicting after {attempt} merges, overwriting")
+
+        written, versions, current = await storage.compare_and_set(state.key, values, expected)
+        if written:
+            for key, model in pending.items():
+                if model is not None:
+                    track_loaded(model, values[key], versions[key])
+            return
+
+        metrics.incr("state.cas_conflict")
+        for key, theirs in current.items():
+            model = pending[key]
+            if theirs is None:
+                # Deleted by someone else, e.g. a logout, do not bring it back
+                metrics.incr("state.cas_dropped")
+                del pending[key]
+                continue
+            _rebase(model, values[key], theirs, versions[key])
+            metrics.incr("state.cas_merged")
+        if not pending:
+            return